@@ -1,14 +1,25 @@
-import streamlit as st
-import pickle
-import pandas as pd
-from clf_funcs import TextPreprocessor, dummy
 import time
+start_time = time.perf_counter()
+
+import streamlit as st
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
 import nltk
-from copy import deepcopy
-from wordcloud import WordCloud
+from clf_funcs import predict_with_proba
+from model_artifact import is_artifact, load_model
+from build_explorer import Explorer, is_explorer
+from similarity import is_similarity_index
+
+# Wordclouds are pre-rendered by build_explorer.py, so wordcloud / matplotlib aren't needed here
+
+
+# Seconds spent in each step of this run, shown at the bottom of the sidebar
+timings = dict()
+
+def timed(label, fn, *args):
+    t = time.perf_counter()
+    result = fn(*args)
+    timings[label] = time.perf_counter() - t
+    return result
 
 
 st.write('''
@@ -29,32 +40,42 @@ assign the statistically most likely job title.
 input_str = st.text_area('Copy & paste a job description here', height=200)
 process_button = st.button('Run classifier')
 
-nltk.download('stopwords', quiet=True)
-nltk.download('punkt', quiet=True)
-nltk.download('wordnet', quiet=True)
-
+@st.cache(suppress_st_warning=True, show_spinner=False, allow_output_mutation=True)
+def download_nltk_data():
+    # Only hits the network the first time, after that the corpora are found locally
+    for resource, path in [('stopwords', 'corpora/stopwords'), ('punkt', 'tokenizers/punkt'), ('wordnet', 'corpora/wordnet')]:
+        try:
+            nltk.data.find(path)
+        except LookupError:
+            nltk.download(resource, quiet=True)
+    return True
+
+# Cached once per server process and shared read-only between sessions, so no copy is needed
 @st.cache(suppress_st_warning=True, show_spinner=False, allow_output_mutation=True)
 def load_clf():
-    with open('clf.pkl','rb') as f:
-        clf = pickle.load(f)
-        st.write('Classifier loaded')
-    return clf
+    # Prefer the memory-mapped export (python app/model_artifact.py clf.pkl model) when there is one.
+    # Tokens are cached so reruns with the same text skip tokenising
+    path = 'model' if is_artifact('model') else 'clf.pkl'
+    return load_model(path, cache='memory')
 
-clf_ = load_clf()
-clf = deepcopy(clf_) # Coppy with trained params
+# Built by python app/similarity.py df_preprocessed.csv similar, queries are vectorised by the classifier
+@st.cache(suppress_st_warning=True, show_spinner=False, allow_output_mutation=True)
+def load_similarity():
+    # The read side needs pandas for the ads table, only imported once there is an index to query
+    from similarity import SimilarityIndex
+    return SimilarityIndex('similar', load_clf())
+
+timed('NLTK data', download_nltk_data)
+clf = timed('Load classifier', load_clf)
 
 if process_button:
     
     if len(input_str) < 1:
         st.write('Can\'t classify a blank job description')
     else:
-        # Classify
+        # Classify, label and probabilities from one pass through the pipeline
         X_pred = [input_str]
-        y_pred = clf.predict(X_pred)
-        
-        # Probabilities
-        y_pred_proba = clf.predict_proba(X_pred)
-        list_of_classes = list(clf['clf'].classes_)
+        y_pred, y_pred_proba, list_of_classes = timed('Inference', predict_with_proba, clf, X_pred)
         max_idx = np.argmax(y_pred_proba)
         # y_pred_proba_max = y_pred_proba[max_idx]
         
@@ -62,6 +83,14 @@ if process_button:
         job_result_proba = y_pred_proba[0,max_idx]
         st.write(f'This is a **{job_result}** job, with a probability of {job_result_proba*100:.1f}%')
         st.balloons()
+
+        # Nearest scraped ads in the classifier's TF-IDF space
+        if is_similarity_index('similar'):
+            similarity_index = timed('Load similarity index', load_similarity)
+            similar = timed('Similar ads', similarity_index.top_k, input_str, 5)
+            st.write('The most similar job ads I scraped:')
+            for ad in similar.to_dict(orient='records'):
+                st.write(f'- {ad["title"]} (*{ad["title_simplified"]}*), similarity {ad["score"]:.2f}')
         # st.write(y_pred_proba,list_of_classes,max_idx,y_pred_proba[0,max_idx])
         
 
@@ -110,56 +139,30 @@ with st.expander('Explore the data interactively', True):
     Use the below to explore the raw data across all the scraped job ads
     ''')
 
-    # Raw data view
-    # Load in the data
-    @st.cache(suppress_st_warning=True, show_spinner=False)
-    def load_df():
-        df = pd.read_csv('df_preprocessed.csv', index_col=0)
-        return df
-    df = load_df().copy()
-
-    # Display a listbox
-    title_options = df['title_simplified'].unique().tolist()
-    title_sel = st.selectbox('To explore the data interactively, select a job title from the dropdown below:',title_options)
-
-    # Display a sample of text data
-    st.write(f'Below is a randomly sampled job description for **{title_sel}** jobs')
-    # btn_shuffle_df = st.button('Shuffle')
-
-    def shuffle_df(title_sel, changed):
-        mask = df['title_simplified'] == title_sel
-        df_display = df[mask].sample(1)
-        df_display = df_display[['title_simplified', 'description']]
-        # df_display.description = df_display.description.apply(lambda x: x[:300]+'...')
-        df_display = df_display.rename(columns={'title_simplified':'Job Title', 'description':'Job Description'})
-        return df_display
-
-    btn_shuffle_df = True
-    changed = True if btn_shuffle_df else False
-    df_display = shuffle_df(title_sel, changed)
-    changed = False
-    st.text_area('Sampled job description text',value=df_display['Job Description'].values[0], height=300)
-
-    # Wordcloud
-    st.write(f'''
-    It can be quite powerful to view the word frequencies for a given set of text data using a wordcloud below is a wordcloud 
-    generated for **{title_sel}** jobs
-    ''')
+    # Only the small precomputed artifacts are loaded (python app/build_explorer.py df_preprocessed.csv explorer),
+    # descriptions are read from disk one at a time and the wordclouds are already rendered
+    @st.cache(suppress_st_warning=True, show_spinner=False, allow_output_mutation=True)
+    def load_explorer():
+        return Explorer('explorer')
+    if not is_explorer('explorer'):
+        st.warning("The data explorer hasn't been built yet, run: python app/build_explorer.py df_preprocessed.csv explorer")
+    else:
+        explorer = timed('Load explorer index', load_explorer)
+
+        # Display a listbox
+        title_sel = st.selectbox('To explore the data interactively, select a job title from the dropdown below:',explorer.titles)
 
-    @st.cache(suppress_st_warning=True, show_spinner=False)
-    def get_wordcloud(title_sel):
-        mask = df.title_simplified == title_sel
-        text = ' '.join(df[mask].description)
-        # text = df[mask].description
-        wordcloud = WordCloud(max_font_size=100, width=800, height=400, random_state=42).generate(text)
-        WordCloud()
-        return wordcloud
-
-    wc = get_wordcloud(title_sel)
-    fig = plt.figure(figsize=[10,10])
-    plt.imshow(wc, interpolation="bilinear")
-    plt.axis("off")
-    st.pyplot(fig)
+        # Display a sample of text data
+        st.write(f'Below is a randomly sampled job description for **{title_sel}** jobs')
+        description = timed('Sample description', explorer.sample, title_sel)
+        st.text_area('Sampled job description text',value=description, height=300)
+
+        # Wordcloud
+        st.write(f'''
+        It can be quite powerful to view the word frequencies for a given set of text data using a wordcloud below is a wordcloud 
+        generated for **{title_sel}** jobs
+        ''')
+        st.image(explorer.wordcloud_path(title_sel), use_column_width=True)
 
 with st.expander('Classification model', True):
     st.write('''
@@ -187,4 +190,6 @@ with st.expander('Classification model', True):
     frequently in many job adverts, and words which occur very infrequently.
     ''')
 
-
+timings['Whole run'] = time.perf_counter() - start_time
+with st.sidebar.expander('Timings'):
+    st.write('\n'.join(f'- {label}: {seconds*1000:.1f} ms' for label, seconds in timings.items()))
@@ -0,0 +1,109 @@
+'''Classify job descriptions in bulk with the clf.pkl pipeline.
+
+Input can be a scraped .csv, a .parquet file or Parquet dataset folder, or "-" for
+JSON lines on stdin (one {"id": ..., "description": ...} object per line).
+The input is read in chunks, each doc is tokenised once and labels + probabilities
+come from a single predict_proba call.  Results are written as each chunk finishes.
+
+e.g.
+    python app/batch_predict.py data/data.csv -o predictions.csv
+    python app/batch_predict.py data/parquet/jobs -o predictions.csv --n-jobs -1
+    cat new_ads.jsonl | python app/batch_predict.py - -o -
+'''
+import argparse
+import json
+import os
+import sys
+import time
+
+import pandas as pd
+
+from clf_funcs import predict_with_proba
+from model_artifact import load_model
+
+
+def read_chunks(path, column, id_column, chunksize, extra_columns=()):
+    '''Yield DataFrames of up to chunksize rows holding the id (if present) and text columns,
+    plus any extra_columns (Parquet only reads the columns asked for)'''
+    if path == '-':
+        rows = []
+        for line in sys.stdin:
+            if line.strip():
+                rows.append(json.loads(line))
+            if len(rows) >= chunksize:
+                yield pd.DataFrame(rows)
+                rows = []
+        if rows:
+            yield pd.DataFrame(rows)
+
+    elif os.path.isdir(path) or path.endswith('.parquet'):
+        import pyarrow.dataset as ds
+        dataset = ds.dataset(path, format='parquet', partitioning='hive')
+        columns = [c for c in [id_column, column, *extra_columns] if c in dataset.schema.names]
+        for batch in dataset.to_batches(columns=columns, batch_size=chunksize):
+            if batch.num_rows > 0:
+                yield batch.to_pandas()
+
+    else:
+        for chunk in pd.read_csv(path, index_col=0, chunksize=chunksize):
+            yield chunk
+
+
+def predict_chunk(clf, chunk, column, id_column):
+    docs = chunk[column].fillna('').astype(str).tolist()
+    labels, proba, classes = predict_with_proba(clf, docs)
+
+    result = pd.DataFrame(proba, columns=[f'proba_{c}' for c in classes])
+    result.insert(0, 'label', labels)
+    if id_column in chunk.columns:
+        result.insert(0, id_column, chunk[id_column].values)
+    return result
+
+
+def write_chunk(result, output, first):
+    if output == '-':
+        for record in result.to_dict(orient='records'):
+            print(json.dumps(record))
+        sys.stdout.flush()
+    else:
+        result.to_csv(output, mode='w' if first else 'a', header=first, index=False)
+
+
+def batch_predict(path, output, model='clf.pkl', column='description', id_column='id',
+                  chunksize=1000, n_jobs=None):
+    '''Classify every doc in path, writing results to output (a .csv, or "-" for stdout).
+    model can be the pickled pipeline or an exported artifact folder (see model_artifact.py).
+    Returns the number of docs classified'''
+    clf = load_model(model, n_jobs=n_jobs)
+
+    n_docs = 0
+    start = time.perf_counter()
+    for chunk in read_chunks(path, column, id_column, chunksize):
+        result = predict_chunk(clf, chunk, column, id_column)
+        write_chunk(result, output, first=n_docs == 0)
+        n_docs = n_docs + len(result)
+        print(f'{n_docs} docs classified', file=sys.stderr)
+
+    elapsed = time.perf_counter() - start
+    rate = n_docs / elapsed if elapsed > 0 else 0
+    print(f'Classified {n_docs} docs in {elapsed:.1f}s ({rate:.1f} docs/sec)', file=sys.stderr)
+    return n_docs
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Classify job descriptions with the clf.pkl pipeline')
+    parser.add_argument('input', help='.csv, .parquet, Parquet dataset folder, or - for JSON lines on stdin')
+    parser.add_argument('-o', '--output', default='predictions.csv', help='output .csv, or - for JSON lines on stdout')
+    parser.add_argument('--model', default='clf.pkl', help='pickled pipeline, or exported artifact folder')
+    parser.add_argument('--column', default='description', help='column holding the job description text')
+    parser.add_argument('--id-column', default='id', help='copied to the output if present')
+    parser.add_argument('--chunksize', type=int, default=1000)
+    parser.add_argument('--n-jobs', type=int, default=None, help='tokeniser worker processes, -1 for all CPUs')
+    args = parser.parse_args()
+
+    batch_predict(args.input, args.output, model=args.model, column=args.column,
+                  id_column=args.id_column, chunksize=args.chunksize, n_jobs=args.n_jobs)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+'''Build the small artifacts behind the app's "Explore the data" section.
+
+Reads df_preprocessed.csv once and writes, to a folder (default explorer/):
+  - index.json:       for each title_simplified, its row range, job count and file names
+  - descriptions.txt: every description as utf-8, grouped by title
+  - offsets.npy:      byte offset of each description in descriptions.txt (n_rows + 1 entries)
+  - freq_<title>.json: the word frequencies of each title's wordcloud
+  - wordcloud_<title>.png
+
+The app then samples a description by reading one byte range, and shows the pre-rendered
+wordcloud, without ever loading the full frame.
+
+e.g.
+    python app/build_explorer.py df_preprocessed.csv explorer
+'''
+import argparse
+import json
+import os
+import re
+
+import numpy as np
+
+INDEX_FILE = 'index.json'
+DESCRIPTIONS_FILE = 'descriptions.txt'
+OFFSETS_FILE = 'offsets.npy'
+# Same settings the app used to generate wordclouds on the fly
+WORDCLOUD_KWARGS = dict(max_font_size=100, width=800, height=400, random_state=42)
+
+
+def slugify(title):
+    return re.sub(r'[^a-z0-9]+', '_', title.lower()).strip('_')
+
+
+def build_explorer(f_name='df_preprocessed.csv', folder='explorer', top_words=200, verbose=True):
+    from wordcloud import WordCloud
+
+    # Only the build needs pandas, the app's Explorer reads json and numpy files
+    import pandas as pd
+    df = pd.read_csv(f_name, usecols=['title_simplified', 'description'])
+    df = df.dropna(subset=['title_simplified'])
+    df['description'] = df['description'].fillna('')
+    os.makedirs(folder, exist_ok=True)
+
+    # Titles keep their order of first appearance, as in the app's dropdown
+    titles = df['title_simplified'].unique().tolist()
+    index = dict()
+    offsets = [0]
+    row = 0
+    with open(os.path.join(folder, DESCRIPTIONS_FILE), 'wb') as f:
+        for title in titles:
+            descriptions = df.loc[df['title_simplified'] == title, 'description'].tolist()
+            for description in descriptions:
+                data = description.encode('utf-8')
+                f.write(data)
+                offsets.append(offsets[-1] + len(data))
+
+            # generate() is process_text() + generate_from_frequencies(), split so the frequencies can be kept
+            slug = slugify(title)
+            wordcloud = WordCloud(**WORDCLOUD_KWARGS)
+            frequencies = wordcloud.process_text(' '.join(descriptions))
+            wordcloud.generate_from_frequencies(frequencies)
+            wordcloud.to_file(os.path.join(folder, f'wordcloud_{slug}.png'))
+            top = sorted(frequencies.items(), key=lambda x: x[1], reverse=True)[:top_words]
+            with open(os.path.join(folder, f'freq_{slug}.json'), 'w') as f_freq:
+                json.dump(dict(top), f_freq)
+
+            index[title] = {'rows': [row, row + len(descriptions)],
+                            'count': len(descriptions),
+                            'wordcloud': f'wordcloud_{slug}.png',
+                            'frequencies': f'freq_{slug}.json'}
+            row = row + len(descriptions)
+            if verbose: print(f'{title}: {len(descriptions)} jobs')
+
+    np.save(os.path.join(folder, OFFSETS_FILE), np.array(offsets, dtype=np.int64))
+    with open(os.path.join(folder, INDEX_FILE), 'w') as f:
+        json.dump(index, f, indent=2)
+    if verbose: print(f'Explorer artifacts for {len(titles)} titles written to {folder}')
+    return index
+
+
+def is_explorer(path):
+    return os.path.isfile(os.path.join(path, INDEX_FILE))
+
+
+class Explorer:
+    '''Read side of the artifacts, used by the app'''
+
+    def __init__(self, folder='explorer'):
+        self.folder = folder
+        with open(os.path.join(folder, INDEX_FILE), 'r') as f:
+            self.index = json.load(f)
+        self.offsets = np.load(os.path.join(folder, OFFSETS_FILE), mmap_mode='r')
+        self.titles = list(self.index)
+
+    def __repr__(self):
+        return f'Explorer(folder="{self.folder}", {len(self.titles)} titles)'
+
+    def description(self, row):
+        '''Read one description from disk by its row number'''
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        with open(os.path.join(self.folder, DESCRIPTIONS_FILE), 'rb') as f:
+            f.seek(start)
+            return f.read(end - start).decode('utf-8')
+
+    def sample(self, title, random_state=None):
+        '''A randomly chosen description for a title'''
+        first, last = self.index[title]['rows']
+        row = np.random.RandomState(random_state).randint(first, last)
+        return self.description(row)
+
+    def wordcloud_path(self, title):
+        return os.path.join(self.folder, self.index[title]['wordcloud'])
+
+    def frequencies(self, title):
+        with open(os.path.join(self.folder, self.index[title]['frequencies']), 'r') as f:
+            return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Precompute the app\'s data explorer artifacts')
+    parser.add_argument('input', nargs='?', default='df_preprocessed.csv')
+    parser.add_argument('folder', nargs='?', default='explorer')
+    parser.add_argument('--top-words', type=int, default=200, help='word frequencies kept per title')
+    args = parser.parse_args()
+    build_explorer(args.input, args.folder, top_words=args.top_words)
+
+
+if __name__ == '__main__':
+    main()
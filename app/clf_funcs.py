@@ -1,6 +1,17 @@
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
 import nltk
+import numpy as np
 from nltk.corpus import stopwords
 
+from joblib import Parallel, delayed
 from sklearn.base import BaseEstimator, TransformerMixin
 
 
@@ -9,17 +20,33 @@ from sklearn.base import BaseEstimator, TransformerMixin
 def dummy(doc):
     return doc
 
+# Words dropped after lemmatising, they just echo the job titles being classified
+WORDS_TO_REMOVE = frozenset(['scientist', 'science', 'analyst', 'analysis', 'engineer'])
+
+
+# NLTK resources are built once, on first use (the app downloads the corpora after import)
+@lru_cache(maxsize=None)
+def get_stop_words():
+    return frozenset(stopwords.words("english"))
+
+@lru_cache(maxsize=None)
+def get_lemmatizer():
+    return nltk.WordNetLemmatizer()
+
+# Job ads reuse a small vocabulary, so most lemma lookups are cache hits
+@lru_cache(maxsize=100000)
+def lemmatize_word(word):
+    return get_lemmatizer().lemmatize(word)
+
 # Remove stopwords and punctuation
 def remove_stopwords_doc(doc):
-    # load stopwords and
-    stop_words = set(stopwords.words("english"))
+    stop_words = get_stop_words()
     words = [w for w in doc if (w not in stop_words) & (w.isalpha())]
     return words
 
 # Lemmatise a tokenised sentence
 def lemmatize_sent(sent):
-    lemmatizer = nltk.WordNetLemmatizer()
-    sent_out = [lemmatizer.lemmatize(w) for w in sent]
+    sent_out = [lemmatize_word(w) for w in sent]
     return sent_out
 
 def tokenize_doc(doc):
@@ -28,37 +55,216 @@ def tokenize_doc(doc):
     - word tokenize
     - remove stopwords
     - lemmatize each word
-    - add n_grams'''
+    - add n_grams
+    The filter / lemmatise / bigram steps are done in a single pass over each sentence'''
+    stop_words = get_stop_words()
     
     # Tidy up doc
     doc = doc.lower()               # Lower case the whole doc
     doc = doc.replace('\n',' ')     # Replace line breaks with spaces for tokenisation with weird formatting
     
-    # Might eventually add n-grams in this loop
-    sents_list = nltk.sent_tokenize(doc)                               # Sentence tokenise the document (into list of sentences)
-    sents_list = [nltk.word_tokenize(sent) for sent in sents_list]          # Word tokenize each sentence
-    sents_list = [remove_stopwords_doc(sent) for sent in sents_list]        # Remove stopwords from each sentence
-    sents_list = [lemmatize_sent(sent) for sent in sents_list]              # Lemmatize each sentence
-    words_to_remove = ['scientist', 'science', 'analyst', 'analysis', 'engineer'] # Hardcoded words to remove
-    sents_list = [[w for w in sent if w not in words_to_remove] for sent in sents_list] # Remove unwanted words
-    ngrams_list = [nltk.ngrams(sent,2) for sent in sents_list]
+    words = []
+    bigrams = []
+    for sent in nltk.sent_tokenize(doc):
+        prev = None                 # Bigrams don't cross sentence boundaries
+        for w in nltk.word_tokenize(sent):
+            if w in stop_words or not w.isalpha():
+                continue
+            w = lemmatize_word(w)
+            if w in WORDS_TO_REMOVE:
+                continue
+            words.append(w)
+            if prev is not None:
+                bigrams.append(prev + ' ' + w)
+            prev = w
     
-    # Flatten lists
-    sent_expanded = [word for sent in sents_list for word in sent]          # [item for sublist in sents_list for item in sublist]
-    ngrams_expanded = [gram for sent in ngrams_list for gram in sent]       # Same for ngrams_list
-    ngrams_expanded = [' '.join(gram) for gram in ngrams_expanded]          # Convert ngram tuples to string token
-    tokens_list = sent_expanded + ngrams_expanded                          # Join into one long list
+    return words + bigrams
+
+
+# Bump when tokenize_doc's output changes, so cached tokens from older versions aren't reused
+TOKENIZER_VERSION = 1
+
+
+def tokenizer_config():
+    '''Everything that affects tokenize_doc output, hashed into every cache key'''
+    return f'v{TOKENIZER_VERSION}|english|{",".join(sorted(WORDS_TO_REMOVE))}'
+
+
+class TokenCache:
+    '''Cache of tokenize_doc output keyed by a hash of the tokeniser config and the doc text.
+    - max_size: docs kept in the in-memory LRU tier
+    - path:     optional SQLite file used as a persistent tier, shared between runs and processes
+    Cached token lists are shared, treat them as read-only'''
+
+    # SQLite limits the number of parameters in one statement
+    chunk_size = 500
+
+    def __init__(self, max_size=100000, path=None):
+        self.max_size = max_size
+        self.path = path
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.prefix = tokenizer_config().encode('utf-8') + b'\0'
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.conn = None
+        if path is not None:
+            folder = os.path.dirname(path)
+            if folder and not os.path.isdir(folder):
+                os.makedirs(folder)
+            self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            with self.conn:
+                self.conn.execute('CREATE TABLE IF NOT EXISTS tokens (key TEXT PRIMARY KEY, tokens TEXT)')
+
+    def __repr__(self):
+        return f'TokenCache(max_size={self.max_size}, path={self.path!r}, {len(self.memory)} docs in memory)'
+
+    def key(self, doc):
+        return hashlib.sha256(self.prefix + doc.encode('utf-8')).hexdigest()
+
+    def stats(self):
+        return {'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses,
+                'evictions': self.evictions, 'size': len(self.memory)}
+
+    def _remember(self, key, tokens):
+        # Caller holds the lock
+        self.memory[key] = tokens
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_size:
+            self.memory.popitem(last=False)
+            self.evictions = self.evictions + 1
 
-    return tokens_list
+    def get_many(self, keys):
+        '''Return {key: tokens} for every key found in memory or on disk'''
+        found = dict()
+        with self.lock:
+            for key in keys:
+                if key in self.memory:
+                    self.memory.move_to_end(key)
+                    found[key] = self.memory[key]
+
+            missing = list(set(k for k in keys if k not in found))
+            if self.conn is not None and missing:
+                for start in range(0, len(missing), self.chunk_size):
+                    chunk = missing[start:start+self.chunk_size]
+                    marks = ','.join('?' * len(chunk))
+                    rows = self.conn.execute(f'SELECT key, tokens FROM tokens WHERE key IN ({marks})', chunk)
+                    for key, tokens in rows:
+                        found[key] = json.loads(tokens)
+                        self._remember(key, found[key])
+                        self.disk_hits = self.disk_hits + 1
+
+            n_found = sum(1 for k in keys if k in found)
+            self.hits = self.hits + n_found
+            self.misses = self.misses + len(keys) - n_found
+        return found
+
+    def put_many(self, items):
+        '''Store (key, tokens) pairs in memory and, if there is one, on disk'''
+        items = list(items)
+        with self.lock:
+            for key, tokens in items:
+                self._remember(key, tokens)
+            if self.conn is not None:
+                with self.conn:
+                    self.conn.executemany('INSERT OR REPLACE INTO tokens (key, tokens) VALUES (?, ?)',
+                                          [(key, json.dumps(tokens)) for key, tokens in items])
+
+    def clear(self):
+        '''Empty the in-memory tier and reset the counters (the disk tier is kept)'''
+        with self.lock:
+            self.memory.clear()
+            self.hits = self.disk_hits = self.misses = self.evictions = 0
+
+
+# TextPreprocessor's cache param is a name rather than a TokenCache, so sklearn can clone it.
+# Every clone (CV folds, grid search candidates) resolves the same name to the same cache
+_token_caches = dict()
+
+def get_token_cache(cache):
+    '''Resolve a cache setting: None, "memory", or a path to an SQLite file for the disk tier'''
+    if cache is None or isinstance(cache, TokenCache):
+        return cache
+    if cache not in _token_caches:
+        _token_caches[cache] = TokenCache(path=None if cache == 'memory' else cache)
+    return _token_caches[cache]
+
+
+# Tokenise a chunk of docs in a worker process
+def tokenize_chunk(docs):
+    return [tokenize_doc(doc) for doc in docs]
 
 
 class TextPreprocessor(BaseEstimator, TransformerMixin):
-    def __init__(self):
-        return
+    '''Tokenises each document with tokenize_doc.
+    - n_jobs:    number of worker processes (None or 1 runs in-process, -1 uses all CPUs)
+    - chunksize: documents sent to a worker at a time
+    - cache:     None, "memory" or a path to an SQLite file, see TokenCache.
+                 Only docs not already in the cache are tokenised'''
+    def __init__(self, n_jobs=None, chunksize=50, cache=None):
+        self.n_jobs = n_jobs
+        self.chunksize = chunksize
+        self.cache = cache
+
+    def __setstate__(self, state):
+        # Pipelines pickled before these params existed (e.g. clf.pkl) don't have them
+        super().__setstate__(state)
+        self.__dict__.setdefault('n_jobs', None)
+        self.__dict__.setdefault('chunksize', 50)
+        self.__dict__.setdefault('cache', None)
         
     def fit(self, X, y=None): # the fit method does nothing
         return self  
     
     def transform(self, X):
-        X = [tokenize_doc(doc) for doc in X]
-        return X
\ No newline at end of file
+        docs = list(X)
+        cache = get_token_cache(self.cache)
+        if cache is None:
+            return self._tokenize(docs)
+
+        keys = [cache.key(doc) for doc in docs]
+        found = cache.get_many(keys)
+        # Tokenise each uncached doc once, even if it appears several times
+        todo = dict()
+        for key, doc in zip(keys, docs):
+            if key not in found and key not in todo:
+                todo[key] = doc
+        if todo:
+            new = dict(zip(todo, self._tokenize(list(todo.values()))))
+            cache.put_many(new.items())
+            found.update(new)
+        X = [found[key] for key in keys]
+        return X
+
+    def _tokenize(self, docs):
+        if self.n_jobs in (None, 1) or len(docs) <= self.chunksize:
+            return tokenize_chunk(docs)
+        
+        # Chunks come back in submission order so the output lines up with the docs
+        chunks = [docs[i:i+self.chunksize] for i in range(0, len(docs), self.chunksize)]
+        results = Parallel(n_jobs=self.n_jobs)(delayed(tokenize_chunk)(chunk) for chunk in chunks)
+        return [tokens for chunk in results for tokens in chunk]
+
+
+class _PipelineUnpickler(pickle.Unpickler):
+    # clf.pkl was pickled from a notebook, so it refers to __main__.TextPreprocessor etc.
+    def find_class(self, module, name):
+        if module == '__main__' and name in globals():
+            return globals()[name]
+        return super().find_class(module, name)
+
+def load_pipeline(path='clf.pkl'):
+    '''Load the pickled classifier pipeline, from any script (not only one which has
+    imported TextPreprocessor and dummy into __main__)'''
+    with open(path, 'rb') as f:
+        return _PipelineUnpickler(f).load()
+
+def predict_with_proba(clf, X):
+    '''Labels and class probabilities from a single predict_proba call, so each doc is
+    only tokenised and vectorised once.  Returns (labels, proba, classes)'''
+    proba = clf.predict_proba(X)
+    classes = clf.classes_
+    labels = classes[np.argmax(proba, axis=1)]
+    return labels, proba, classes
@@ -0,0 +1,160 @@
+'''Compact, memory-mappable export of the clf.pkl pipeline.
+
+The pickled pipeline holds the TF-IDF vocabulary as a Python dict, which has to be
+rebuilt object by object in every process that loads it.  The artifact instead stores
+plain NumPy arrays in a folder:
+  - vocab.npy:            sorted, utf-8 encoded terms (fixed width bytes), position = feature column
+  - idf.npy:              TF-IDF idf weights per feature
+  - feature_log_prob.npy: Naive Bayes log P(term | class), shape (n_classes, n_features)
+  - class_log_prior.npy:  Naive Bayes log P(class)
+  - meta.json:            classes, TF-IDF settings and the tokeniser config it was trained with
+
+Arrays are loaded with mmap_mode='r', so several serving processes share the same pages.
+CompactPredictor gives the same probabilities as the pipeline without needing sklearn's
+vectoriser.
+
+e.g.
+    python app/model_artifact.py clf.pkl model
+'''
+import argparse
+import json
+import os
+from collections import Counter
+
+import numpy as np
+from scipy import sparse
+from scipy.special import logsumexp
+
+from clf_funcs import TextPreprocessor, load_pipeline, tokenizer_config
+
+ARRAYS = ['vocab', 'idf', 'feature_log_prob', 'class_log_prior']
+
+
+def export_artifact(clf, folder='model'):
+    '''Write the vectoriser and Naive Bayes parameters of a fitted pipeline to folder'''
+    tfidf = clf['tfidf']
+    nb = clf[-1]
+    # The tokens come from TextPreprocessor, anything else the vectoriser does isn't reproduced
+    if tfidf.analyzer != 'word' or tuple(tfidf.ngram_range) != (1, 1) or tfidf.stop_words is not None or tfidf.binary:
+        raise ValueError('Only a TfidfVectorizer passing the pre-tokenised words straight through can be exported')
+
+    terms = sorted(tfidf.vocabulary_, key=lambda t: t.encode('utf-8'))
+    columns = np.array([tfidf.vocabulary_[t] for t in terms])
+    idf = tfidf.idf_ if tfidf.use_idf else np.ones(len(terms))
+
+    os.makedirs(folder, exist_ok=True)
+    arrays = {'vocab': np.array([t.encode('utf-8') for t in terms]),
+              'idf': np.asarray(idf, dtype=np.float64)[columns],
+              'feature_log_prob': np.ascontiguousarray(nb.feature_log_prob_[:, columns]),
+              'class_log_prior': nb.class_log_prior_}
+    for name in ARRAYS:
+        np.save(os.path.join(folder, name + '.npy'), arrays[name])
+
+    meta = {'classes': nb.classes_.tolist(),
+            'norm': tfidf.norm,
+            'sublinear_tf': bool(tfidf.sublinear_tf),
+            'tokenizer': tokenizer_config()}
+    with open(os.path.join(folder, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=2)
+
+
+def is_artifact(path):
+    return os.path.isfile(os.path.join(path, 'meta.json'))
+
+
+class CompactPredictor:
+    '''Predicts from an exported artifact folder, with the same interface as the pipeline
+    (transform / predict / predict_proba / classes_).  n_jobs and cache are passed on to
+    TextPreprocessor'''
+
+    def __init__(self, folder='model', n_jobs=None, cache=None):
+        with open(os.path.join(folder, 'meta.json'), 'r') as f:
+            self.meta = json.load(f)
+        if self.meta['tokenizer'] != tokenizer_config():
+            raise ValueError(f'Artifact was exported with tokeniser "{self.meta["tokenizer"]}", '
+                             f'this code has "{tokenizer_config()}"')
+        for name in ARRAYS:
+            setattr(self, name, np.load(os.path.join(folder, name + '.npy'), mmap_mode='r'))
+        self.folder = folder
+        self.classes_ = np.array(self.meta['classes'])
+        self.preprocessor = TextPreprocessor(n_jobs=n_jobs, cache=cache)
+
+    def __repr__(self):
+        return f'CompactPredictor(folder="{self.folder}", {len(self.vocab)} terms, classes={self.classes_.tolist()})'
+
+    def lookup(self, terms):
+        '''Feature column of each term, -1 where it isn't in the vocabulary'''
+        if len(terms) == 0:
+            return np.zeros(0, dtype=np.int64)
+        keys = np.array([t.encode('utf-8') for t in terms])
+        positions = np.searchsorted(self.vocab, keys)
+        positions = np.minimum(positions, len(self.vocab) - 1)
+        return np.where(self.vocab[positions] == keys, positions, -1)
+
+    def transform(self, X):
+        '''TF-IDF matrix (csr) for the raw docs in X'''
+        return self.vectorize(self.preprocessor.transform(X))
+
+    def vectorize(self, token_lists):
+        '''TF-IDF matrix (csr) for already tokenised docs'''
+        indptr = [0]
+        indices = []
+        data = []
+        for tokens in token_lists:
+            counts = Counter(tokens)
+            columns = self.lookup(list(counts))
+            known = columns >= 0
+            order = np.argsort(columns[known])
+            indices.append(columns[known][order])
+            data.append(np.fromiter(counts.values(), dtype=np.float64, count=len(counts))[known][order])
+            indptr.append(indptr[-1] + known.sum())
+
+        n_features = len(self.vocab)
+        indices = np.concatenate(indices) if indices else np.zeros(0, dtype=np.int64)
+        data = np.concatenate(data) if data else np.zeros(0)
+        if self.meta['sublinear_tf']:
+            data = np.log(data) + 1
+        data = data * self.idf[indices]
+
+        X = sparse.csr_matrix((data, indices, indptr), shape=(len(indptr) - 1, n_features))
+        if self.meta['norm'] is not None:
+            if self.meta['norm'] == 'l2':
+                norms = np.sqrt(X.multiply(X).sum(axis=1)).A1
+            else:
+                norms = abs(X).sum(axis=1).A1
+            norms[norms == 0] = 1
+            X = sparse.diags(1 / norms) @ X
+        return X.tocsr()
+
+    def predict_log_proba(self, X):
+        jll = self.transform(X) @ self.feature_log_prob.T + self.class_log_prior
+        return jll - logsumexp(jll, axis=1, keepdims=True)
+
+    def predict_proba(self, X):
+        return np.exp(self.predict_log_proba(X))
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_log_proba(X), axis=1)]
+
+
+def load_model(path, n_jobs=None, cache=None):
+    '''Load an artifact folder as a CompactPredictor, or a pickled pipeline file'''
+    if os.path.isdir(path):
+        return CompactPredictor(path, n_jobs=n_jobs, cache=cache)
+    clf = load_pipeline(path)
+    clf.set_params(preprocess__n_jobs=n_jobs, preprocess__cache=cache)
+    return clf
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export the clf.pkl pipeline as a compact model artifact')
+    parser.add_argument('pipeline', nargs='?', default='clf.pkl')
+    parser.add_argument('folder', nargs='?', default='model')
+    args = parser.parse_args()
+
+    export_artifact(load_pipeline(args.pipeline), args.folder)
+    print(CompactPredictor(args.folder))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+'''Skill tagging for job descriptions.
+
+Replaces the notebook's add_single_skill / add_all_skills, which scanned the dataframe
+with iterrows once per skill.  Here every pattern is compiled once and run over the
+whole corpus joined into a single string.  It is still one scan of the corpus per skill
+(44 with SKILLS), not a single pass, but each scan runs in the regex engine and Python
+only sees the matches (at most one per doc and skill), rather than one search call per
+doc and skill.
+Gives exactly the same tags as re.search(pattern, description) per doc (tests/test_skills.py).
+'''
+import re
+from bisect import bisect_right
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+# (column, regex) for each skill, descriptions are expected to be lower case.
+# Patterns mustn't use anchors or lookarounds (^ $ \b (?= etc.), as docs are matched in one joined string
+SKILLS = [
+    ('is_python', 'python'),
+    ('is_r', r'\sr(\s|[.,]\s)'),
+    ('is_spark', 'spark'),
+    ('is_java', r'java[\s,.]'),
+    ('is_javascript', 'javascript'),
+    ('is_hadoop', 'hadoop'),
+    ('is_aws', r'[\s\(]aws|amazon web'),
+    ('is_gcp', r'[\s\(]gcp|google cloud'),
+    ('is_azure', 'azure'),
+    ('is_nosql', 'nosql'),
+    ('is_sql', '[^o]sql'),
+    ('is_mongodb', 'mongodb'),
+    ('is_kubernetes', 'kubernetes'),
+    ('is_kafka', 'kafka'),
+    ('is_hive', 'hive'),
+    ('is_nlp', 'nlp|natural language'),
+    ('is_tensorflow', 'tensorflow'),
+    ('is_keras', 'keras'),
+    ('is_pytorch', 'pytorch'),
+    ('is_sklearn', 'sklearn|sci-?kit-?learn'),
+    ('is_dl', 'deep learning'),
+    ('is_etl', 'etl|extract[,-]? ?transform[,-]? ?load'),
+    ('is_excel', 'excel'),
+    ('is_ml', 'ml'),
+    ('is_ai', r'a\.i\.|[\s\(]ai(\s|[.,]\s)|artificial intelligence'),
+    ('is_stats', 'statistics|stats'),
+    ('is_data_mining', 'data[- ]?mining'),
+    ('is_data_analytics', 'data[- ]?analysis|data[- ]?analytics'),
+    ('is_big_data', 'big[ -]?data'),
+    ('is_com_vision', 'computer vision|machine vision'),
+    ('is_c_plus_plus', r'c\+\+'),
+    ('is_sas', r'\ssas(\s|[.,]\s)'),
+    ('is_matlab', 'matlab'),
+    ('is_tableau', 'tableau'),
+    ('is_power_bi', 'power[- ]?bi'),
+    ('is_predictive', 'prediction|predictive'),
+    ('is_story', 'story[- ]?telling| story '),
+    ('is_presenting', 'presentation|presenting|present'),
+    ('is_trading', 'trader|trading'),
+    ('is_jupyter', 'jupyter'),
+    ('is_airflow', 'airflow'),
+    ('is_databricks', 'databricks'),
+    ('is_cloud', 'cloud'),
+    ('is_devops', 'dev[-]?ops'),
+]
+
+# Placed between docs in the joined corpus, none of the skill patterns can match across it
+SEPARATOR = '\x00'
+
+
+class SkillMatches:
+    '''Result of SkillTagger.tag, the first match of each skill found in each doc.
+    - matrix:  sparse bool matrix, docs x skills
+    - columns: skill column names
+    - doc, skill, start, end: one entry per (doc, skill) match, with the match's character offsets'''
+
+    def __init__(self, n_docs, columns, doc, skill, start, end):
+        self.columns = list(columns)
+        self.doc = np.asarray(doc, dtype=np.int64)
+        self.skill = np.asarray(skill, dtype=np.int64)
+        self.start = np.asarray(start, dtype=np.int64)
+        self.end = np.asarray(end, dtype=np.int64)
+        self.matrix = sparse.csr_matrix((np.ones(len(self.doc), dtype=bool), (self.doc, self.skill)),
+                                        shape=(n_docs, len(self.columns)))
+
+    def __repr__(self):
+        return f'SkillMatches({self.matrix.shape[0]} docs, {len(self.columns)} skills, {len(self.doc)} matches)'
+
+    def to_frame(self, index=None):
+        '''Dense bool DataFrame with one is_... column per skill'''
+        return pd.DataFrame(self.matrix.toarray(), columns=self.columns, index=index)
+
+    def counts(self):
+        '''Number of docs tagged with each skill'''
+        return pd.Series(np.asarray(self.matrix.sum(axis=0)).ravel(), index=self.columns)
+
+    def snippets(self, docs, column, numchars=20):
+        '''Text around the first match of a skill, for each doc it was found in.
+        docs must be the same sequence that was tagged.  Returns {doc position: snippet}'''
+        docs = list(docs)
+        k = self.columns.index(column)
+        found = dict()
+        for i, start, end in zip(self.doc[self.skill == k], self.start[self.skill == k], self.end[self.skill == k]):
+            found[int(i)] = docs[i][max(start - numchars, 0):end + numchars]
+        return found
+
+
+class SkillTagger:
+    '''Tags docs with every skill, one regex scan of the joined corpus per skill.
+    skills is a list of (column, regex) pairs, see SKILLS'''
+
+    def __init__(self, skills=SKILLS):
+        self.skills = list(skills)
+        self.columns = [column for column, _ in self.skills]
+        self.patterns = [re.compile(pattern) for _, pattern in self.skills]
+
+    def __repr__(self):
+        return f'SkillTagger({len(self.skills)} skills)'
+
+    def tag(self, docs):
+        docs = ['' if not isinstance(doc, str) else doc for doc in docs]
+        # A separator inside a doc could hide or fake matches, so match those docs on their own
+        bad_docs = [i for i, doc in enumerate(docs) if SEPARATOR in doc]
+        corpus_docs = [doc.replace(SEPARATOR, ' ') for doc in docs] if bad_docs else docs
+
+        # Character offsets of each doc in the joined corpus (plain lists, bisect is quicker than numpy per match)
+        starts, ends = [], []
+        offset = 0
+        for doc in corpus_docs:
+            starts.append(offset)
+            ends.append(offset + len(doc))
+            offset = offset + len(doc) + len(SEPARATOR)
+        corpus = SEPARATOR.join(corpus_docs)
+
+        doc_idx, skill_idx, match_start, match_end = [], [], [], []
+        for k, pattern in enumerate(self.patterns):
+            if not docs:
+                break
+            for i, start, end in self._scan(pattern, corpus, docs, starts, ends, bad_docs):
+                doc_idx.append(i)
+                skill_idx.append(k)
+                match_start.append(start)
+                match_end.append(end)
+            for i in bad_docs:
+                match = pattern.search(docs[i])
+                if match is not None:
+                    doc_idx.append(i)
+                    skill_idx.append(k)
+                    match_start.append(match.start())
+                    match_end.append(match.end())
+
+        return SkillMatches(len(docs), self.columns, doc_idx, skill_idx, match_start, match_end)
+
+    @staticmethod
+    def _scan(pattern, corpus, docs, starts, ends, bad_docs):
+        # Yields (doc, start, end) of the first match in each doc, with offsets relative to the doc
+        skip = set(bad_docs)
+        pos = 0
+        while True:
+            match = pattern.search(corpus, pos)
+            if match is None:
+                return
+            i = bisect_right(starts, match.start()) - 1
+            if match.start() >= ends[i]:
+                # Started on a separator, isn't a match in any doc
+                pos = match.start() + 1
+                continue
+
+            if i not in skip:
+                if match.end() <= ends[i]:
+                    yield i, match.start() - starts[i], match.end() - starts[i]
+                else:
+                    # Ran over the end of the doc, check the doc by itself
+                    match = pattern.search(docs[i])
+                    if match is not None:
+                        yield i, match.start(), match.end()
+            if i + 1 >= len(starts):
+                return
+            pos = starts[i + 1]
+
+
+def add_all_skills(df, verbose=False, tagger=None):
+    '''Add an is_... bool column per skill to df, tagging df.description.
+    Drop-in replacement for the notebook function of the same name'''
+    tagger = tagger or SkillTagger()
+    matches = tagger.tag(df.description.tolist())
+    df = df.copy()
+    skills = matches.to_frame(index=df.index)
+    for column in skills.columns:
+        df[column] = skills[column]
+
+    if verbose:
+        for column, count in matches.counts().items():
+            print(f'Jobs tagged with {column}: {count}')
+    return df
@@ -0,0 +1,92 @@
+'''Job title normalisation (the title_simplified target variable).
+
+Replaces the notebook's add_target_variable, which ran an if/elif chain over every row
+with iterrows.  The chain is now an ordered rule table: the first rule that matches a
+title gives its label.  Rules are applied with vectorised pandas string methods, over
+the distinct titles only, then mapped back onto every row.
+'''
+from functools import lru_cache
+
+import pandas as pd
+
+# (label, pattern, regex) in priority order, titles are expected to be lower case.
+# Regex rules use re.match semantics, as in the original chain
+RULES = [
+    ('data scientist', r'.*data.*scien(tist|ce)', True),
+    ('nlp', 'nlp', False),
+    ('data analyst', 'data analyst', False),
+    ('data analyst', r'.*data.*analy(st|tics)', True),
+    ('data engineer', 'data engineer', False),
+    ('data engineer', 'cloud engineer', False),
+    ('business analyst', 'business analyst', False),
+    ('business intelligence', r'.*(business.*(intel|analy(sis|st))|bi)', True),
+    ('machine learning engineer', r'.*machine.*learning', True),
+    ('ai', r'.*(artificial.*intelligence|\sai\s)', True),
+    ('software engineer', r'.*software.*engineer', True),
+    ('analyst', r'.*analy(st|tics)', True),
+    ('systems', 'systems', False),
+    ('software developer', 'software develop', False),
+    ('developer', 'developer', False),
+    ('research', 'research', False),
+    ('scientist', 'scientist', False),
+    ('admin', 'admin', False),
+    ('devops', 'devops', False),
+]
+UNMATCHED = 'other'
+
+# Small classes folded into bigger ones after labelling
+MERGES = {
+    'nlp': 'data scientist',
+    'ai': 'data scientist',
+    'systems': 'software engineer',
+    'devops': 'software engineer',
+}
+
+
+def _apply_rules(titles):
+    # Label for each title in a Series of distinct titles
+    labels = pd.Series(UNMATCHED, index=titles.index, dtype=object)
+    todo = pd.Series(True, index=titles.index)
+    for label, pattern, regex in RULES:
+        remaining = titles[todo]
+        if len(remaining) == 0:
+            break
+        if regex:
+            hit = remaining.str.match(pattern)
+        else:
+            hit = remaining.str.contains(pattern, regex=False)
+        hit = hit[hit].index
+        labels[hit] = label
+        todo[hit] = False
+    return labels
+
+
+def simplify_titles(titles, merge=False):
+    '''title_simplified label for each title, as a Series aligned with titles.
+    Each distinct title is only matched once.  merge=True also applies MERGES'''
+    titles = pd.Series(titles).fillna('').astype(str)
+    unique = pd.Series(titles.unique())
+    labels = _apply_rules(unique)
+    if merge:
+        labels = labels.replace(MERGES)
+    lookup = dict(zip(unique, labels))
+    return titles.map(lookup)
+
+
+@lru_cache(maxsize=10000)
+def simplify_title(title, merge=False):
+    '''Label for a single title, memoised'''
+    return simplify_titles([title], merge=merge).iloc[0]
+
+
+def add_target_variable(df, merge=False, verbose=True):
+    '''Add the title_simplified column from df.title.
+    Drop-in replacement for the notebook function of the same name'''
+    df = df.copy()
+    df['title_simplified'] = simplify_titles(df['title'], merge=merge).values
+
+    if verbose:
+        count_unmatched = (df['title_simplified'] == UNMATCHED).sum()
+        print(f'Count of unmatched: {count_unmatched}')
+        print(f'Cound of matched:   {len(df)-count_unmatched} ')
+    return df
@@ -0,0 +1,278 @@
+'''Out-of-core training of the job title classifier.
+
+clf.pkl can only be rebuilt by refitting TF-IDF + SMOTE + Naive Bayes on the whole corpus
+in memory.  This trains a streaming alternative instead:
+    TextPreprocessor -> HashingVectorizer -> MultinomialNB.partial_fit
+The hashing vectoriser is stateless (no vocabulary or idf to fit), so scraped data can be
+read in chunks and each night's new ads simply update the saved model, in bounded memory.
+
+Rows are split into train / holdout by a hash of their id, so an ad always lands on the
+same side however the data is batched.  Ids already trained on are recorded next to the
+model (<model>.trained.sqlite), so re-reading a file only adds the ads it hasn't seen.  The holdout is never trained on, and --report
+compares the incremental model on it with a full in-memory retrain of the clf.pkl pipeline.
+
+e.g.
+    python app/train_incremental.py data/data_england.csv --model clf_incremental.pkl
+    python app/train_incremental.py data/new_ads.csv --model clf_incremental.pkl
+    python app/train_incremental.py data/parquet/jobs --model clf_check.pkl --report report.json
+The saved model is a pipeline like clf.pkl, so batch_predict.py --model clf_incremental.pkl works too.
+'''
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import time
+import warnings
+import zlib
+
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfVectorizer
+from sklearn.metrics import accuracy_score, precision_recall_fscore_support
+from sklearn.naive_bayes import MultinomialNB
+from sklearn.pipeline import Pipeline
+
+from batch_predict import read_chunks
+from clf_funcs import TextPreprocessor, dummy, load_pipeline
+from titles import simplify_titles
+
+# The classes clf.pkl was trained on (see jobs-analysis-nlp.ipynb)
+CLASSES = ['data analyst', 'data engineer', 'data scientist']
+LABEL_COLUMN = 'title_simplified'
+
+
+def make_model(n_features=2**18, n_jobs=None, cache=None):
+    '''Unfitted streaming pipeline.  fit_prior=False stands in for clf.pkl's SMOTE step,
+    which needs the whole training set at once'''
+    return Pipeline([
+        ('preprocess', TextPreprocessor(n_jobs=n_jobs, cache=cache)),
+        ('hashing', HashingVectorizer(tokenizer=dummy, preprocessor=dummy, token_pattern=None, lowercase=False,
+                                      alternate_sign=False, norm='l2', n_features=n_features)),
+        ('clf', MultinomialNB(fit_prior=False)),
+    ])
+
+
+def is_holdout(keys, holdout=0.2):
+    '''Boolean mask, True for the keys in the holdout set.  Stable across runs and chunkings'''
+    cutoff = int(holdout * 10000)
+    return np.array([zlib.crc32(str(k).encode('utf-8')) % 10000 < cutoff for k in keys], dtype=bool)
+
+
+class TrainedIds:
+    '''Persistent record of the ads a model has been trained on, in a small SQLite file
+    (like indeed/seen_index.py), so partial_fit never sees the same ad twice'''
+
+    # SQLite limits the number of parameters in one statement
+    chunk_size = 500
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        with self.conn:
+            self.conn.execute('CREATE TABLE IF NOT EXISTS trained (key TEXT PRIMARY KEY)')
+
+    def __repr__(self):
+        return f'TrainedIds(path="{self.path}", {len(self)} ads)'
+
+    def __len__(self):
+        return self.conn.execute('SELECT COUNT(*) FROM trained').fetchone()[0]
+
+    @staticmethod
+    def key(job_id):
+        # Keys are docs when there's no id column, store a hash rather than the whole text
+        job_id = str(job_id)
+        return job_id if len(job_id) <= 64 else hashlib.sha256(job_id.encode('utf-8')).hexdigest()
+
+    def seen(self, keys):
+        '''Return the subset of keys which have already been trained on'''
+        lookup = {self.key(k): k for k in keys}
+        stored = list(lookup)
+        found = set()
+        for start in range(0, len(stored), self.chunk_size):
+            chunk = stored[start:start+self.chunk_size]
+            marks = ','.join('?' * len(chunk))
+            rows = self.conn.execute(f'SELECT key FROM trained WHERE key IN ({marks})', chunk)
+            found.update(lookup[row[0]] for row in rows)
+        return found
+
+    def add(self, keys):
+        with self.conn:
+            self.conn.executemany('INSERT OR IGNORE INTO trained (key) VALUES (?)', [(self.key(k),) for k in keys])
+
+    def close(self):
+        self.conn.close()
+
+
+def prepare_chunk(chunk, classes, column='description', id_column='id'):
+    '''(docs, labels, keys) for the rows of chunk labelled with one of classes.
+    Labels come from title_simplified, or are worked out from the title if it's missing.
+    A chunk can easily have none (e.g. the rows of an "AI" query), then the lists are empty'''
+    if LABEL_COLUMN in chunk.columns:
+        labels = chunk[LABEL_COLUMN]
+    else:
+        # Scraped titles are mixed case, the title rules expect lower case
+        labels = simplify_titles(chunk['title'].fillna('').astype(str).str.lower())
+    keep = labels.isin(classes).values & chunk[column].notna().values
+    docs = chunk[column][keep].astype(str).tolist()
+    keys = chunk[id_column][keep].tolist() if id_column in chunk.columns else docs
+    return docs, labels[keep].tolist(), keys
+
+
+def save_model(model, path):
+    # Write then rename, so a crash mid-save never leaves a broken model
+    with open(path + '.tmp', 'wb') as f:
+        pickle.dump(model, f)
+    os.replace(path + '.tmp', path)
+
+
+def _no_rows_message(path, classes):
+    return (f'No rows of {path} are labelled with any of {classes}, '
+            f'check the {LABEL_COLUMN} / title column of the input')
+
+
+def train_incremental(path, model_path='clf_incremental.pkl', classes=CLASSES, column='description',
+                      id_column='id', chunksize=1000, holdout=0.2, n_features=2**18, n_jobs=None,
+                      cache=None, verbose=True):
+    '''Update the model saved at model_path (a new one if it doesn't exist) with the
+    training rows of path, read chunksize rows at a time.  Ads already trained on (by id, see
+    TrainedIds) are skipped, as are rows outside the classes (counted in stats['skipped']).
+    Warns if none of the input is in the classes.  Returns (model, stats)'''
+    if os.path.isfile(model_path):
+        model = load_pipeline(model_path)
+        model.set_params(preprocess__n_jobs=n_jobs, preprocess__cache=cache)
+        classes = model['clf'].classes_.tolist()
+        if verbose: print(f'Updating {model_path} ({int(model["clf"].class_count_.sum())} docs trained so far)')
+    else:
+        model = make_model(n_features=n_features, n_jobs=n_jobs, cache=cache)
+        if verbose: print(f'Training new model for classes {classes}')
+
+    trained_ids = TrainedIds(model_path + '.trained.sqlite')
+    new_keys = []  # trained on in this run, only recorded once the model is saved
+    this_run = set()
+    in_classes = 0
+    stats = {'trained': 0, 'held_out': 0, 'skipped': 0, 'already_trained': 0, 'chunks': 0}
+    start = time.perf_counter()
+    for chunk in read_chunks(path, column, id_column, chunksize, extra_columns=[LABEL_COLUMN, 'title']):
+        docs, labels, keys = prepare_chunk(chunk, classes, column, id_column)
+        stats['skipped'] = stats['skipped'] + len(chunk) - len(docs)
+        stats['chunks'] = stats['chunks'] + 1
+        if len(docs) == 0:
+            continue
+        in_classes = in_classes + len(docs)
+        holdout_mask = is_holdout(keys, holdout)
+        stats['held_out'] = stats['held_out'] + int(holdout_mask.sum())
+
+        done = trained_ids.seen([k for k, h in zip(keys, holdout_mask) if not h])
+        train = np.zeros(len(keys), dtype=bool)
+        for i, (key, held_out) in enumerate(zip(keys, holdout_mask)):
+            if not held_out and key not in done and key not in this_run:
+                train[i] = True
+                this_run.add(key)
+        stats['already_trained'] = stats['already_trained'] + int((~holdout_mask).sum() - train.sum())
+        if train.sum() == 0:
+            continue
+
+        X = model[:-1].transform([d for d, t in zip(docs, train) if t])
+        model['clf'].partial_fit(X, np.array(labels)[train], classes=classes)
+        new_keys.extend(k for k, t in zip(keys, train) if t)
+        stats['trained'] = stats['trained'] + int(train.sum())
+        if verbose: print(f'Chunk {stats["chunks"]}: {stats["trained"]} docs trained '
+                          f'({stats["trained"] / (time.perf_counter() - start):.1f} docs/sec)')
+
+    stats['seconds'] = time.perf_counter() - start
+    if in_classes == 0:
+        warnings.warn(_no_rows_message(path, classes))
+    if stats['trained'] > 0:
+        save_model(model, model_path)
+        trained_ids.add(new_keys)
+        if verbose: print(f'Model saved to {model_path}')
+    trained_ids.close()
+    return model, stats
+
+
+def scores(y_true, y_pred):
+    precision, recall, f1, _ = precision_recall_fscore_support(y_true, y_pred, average='weighted', zero_division=0)
+    return {'accuracy': accuracy_score(y_true, y_pred), 'precision': precision, 'recall': recall, 'f1': f1}
+
+
+def compare_with_full_retrain(path, model, classes=CLASSES, column='description', id_column='id',
+                              chunksize=1000, holdout=0.2):
+    '''Accuracy of the incremental model vs the clf.pkl pipeline refitted in memory on
+    the training rows of path, both scored on the holdout rows of path.
+    For a like for like comparison path should hold everything the model was trained on.
+    Raises ValueError if none of path is in the classes'''
+    from imblearn.over_sampling import SMOTE
+    from imblearn.pipeline import Pipeline as ImbPipeline
+
+    train_docs, train_labels, test_docs, test_labels = [], [], [], []
+    for chunk in read_chunks(path, column, id_column, chunksize, extra_columns=[LABEL_COLUMN, 'title']):
+        docs, labels, keys = prepare_chunk(chunk, classes, column, id_column)
+        for doc, label, test in zip(docs, labels, is_holdout(keys, holdout)):
+            if test:
+                test_docs.append(doc)
+                test_labels.append(label)
+            else:
+                train_docs.append(doc)
+                train_labels.append(label)
+    if len(train_docs) + len(test_docs) == 0:
+        raise ValueError(_no_rows_message(path, classes))
+
+    # Same steps as the notebook, both share the in-memory token cache so docs are tokenised once
+    full = ImbPipeline([
+        ('preprocess', TextPreprocessor(cache='memory')),
+        ('tfidf', TfidfVectorizer(tokenizer=dummy, preprocessor=dummy, token_pattern=None, min_df=0.1, max_df=0.9)),
+        ('smote', SMOTE(sampling_strategy='minority', random_state=42)),
+        ('clf', MultinomialNB()),
+    ])
+    start = time.perf_counter()
+    full.fit(train_docs, train_labels)
+    full_seconds = time.perf_counter() - start
+    model.set_params(preprocess__cache='memory')
+
+    report = {'holdout_fraction': holdout,
+              'n_train': len(train_docs),
+              'n_test': len(test_docs),
+              'test_class_counts': {c: test_labels.count(c) for c in classes},
+              'full_retrain': dict(scores(test_labels, full.predict(test_docs)), train_seconds=full_seconds),
+              'incremental': dict(scores(test_labels, model.predict(test_docs)),
+                                  docs_trained=int(model['clf'].class_count_.sum()))}
+    report['accuracy_difference'] = report['incremental']['accuracy'] - report['full_retrain']['accuracy']
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Train or update the streaming job title classifier')
+    parser.add_argument('input', help='.csv, .parquet or Parquet dataset folder of scraped jobs')
+    parser.add_argument('--model', default='clf_incremental.pkl', help='model to update, created if missing')
+    parser.add_argument('--classes', nargs='+', default=CLASSES, help='title_simplified classes (new model only)')
+    parser.add_argument('--column', default='description')
+    parser.add_argument('--id-column', default='id')
+    parser.add_argument('--chunksize', type=int, default=1000)
+    parser.add_argument('--holdout', type=float, default=0.2, help='fraction of ads kept out of training')
+    parser.add_argument('--n-features', type=int, default=2**18, help='hashing vectoriser size (new model only)')
+    parser.add_argument('--n-jobs', type=int, default=None, help='tokenise in parallel, -1 for all cores')
+    parser.add_argument('--report', default=None, help='write a .json comparison with a full retrain')
+    args = parser.parse_args()
+
+    model, stats = train_incremental(args.input, args.model, classes=args.classes, column=args.column,
+                                     id_column=args.id_column, chunksize=args.chunksize, holdout=args.holdout,
+                                     n_features=args.n_features, n_jobs=args.n_jobs)
+    print(f'{stats["trained"]} docs trained in {stats["seconds"]:.1f}s '
+          f'({stats["held_out"]} held out, {stats["already_trained"]} already trained, '
+          f'{stats["skipped"]} not in the classes)')
+
+    if args.report:
+        report = compare_with_full_retrain(args.input, model, classes=model['clf'].classes_.tolist(),
+                                           column=args.column, id_column=args.id_column,
+                                           chunksize=args.chunksize, holdout=args.holdout)
+        report['training'] = stats
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'Holdout accuracy: incremental {report["incremental"]["accuracy"]:.3f}, '
+              f'full retrain {report["full_retrain"]["accuracy"]:.3f}')
+        print(f'Report saved to {args.report}')
+
+
+if __name__ == '__main__':
+    main()
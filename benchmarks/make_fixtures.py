@@ -0,0 +1,122 @@
+'''Generate the synthetic fixtures the benchmarks run against.
+
+The pages copy the structure of the two Indeed search page layouts (and a job
+description page) that the parsers handle, padded out with page furniture to a
+realistic size.  descriptions.jsonl holds a fixed sample of job-ad style texts.
+Everything comes from a seeded random generator, so re-running gives identical files.
+Real pages can be benchmarked instead by copying them over these files.
+
+e.g.
+    python benchmarks/make_fixtures.py
+'''
+import json
+import os
+import random
+from html import escape
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+TITLES = ['Data Scientist', 'Senior Data Engineer', 'Data Analyst', 'Machine Learning Engineer',
+          'Business Intelligence Analyst', 'Lead Data Scientist', 'Junior Data Analyst', 'Cloud Engineer']
+COMPANIES = ['Acme Ltd', 'Skyscanner', 'NHS Scotland', 'Lloyds Banking Group', 'FanDuel', 'Adarga']
+LOCATIONS = ['Edinburgh', 'Glasgow', 'Remote', 'London', 'Aberdeen']
+SALARIES = ['', '£35,000 - £45,000 a year', '£450 a day', '']
+SKILLS = ['Python', 'SQL', 'R', 'Spark', 'AWS', 'Azure', 'GCP', 'Airflow', 'Tableau', 'Power BI',
+          'Excel', 'TensorFlow', 'PyTorch', 'scikit-learn', 'Kafka', 'Databricks', 'statistics', 'NLP']
+SENTENCES = [
+    'We are looking for a {title} to join our growing team in {location}.',
+    'You will work with stakeholders across the business to turn data into insight.',
+    'Experience with {skill} and {skill2} is essential, and {skill3} would be a bonus.',
+    'You will build and maintain data pipelines and machine learning models in production.',
+    'The role involves presenting findings to senior leadership and telling stories with data.',
+    'Our analysts use {skill} every day to answer questions about customers and products.',
+    'You will have a degree in a quantitative subject such as mathematics, physics or computer science.',
+    'We offer flexible working, a generous pension and 30 days holiday.',
+    'Strong communication skills and the ability to explain technical ideas simply.',
+    'You will design experiments, analyse the results and recommend next steps.',
+    'Knowledge of cloud platforms, ETL processes and data warehousing is desirable.',
+    'Join a friendly team that values learning, collaboration and curiosity.',
+]
+
+
+def filler(n):
+    return ''.join(f'<div class="nav-item"><a href="/n{i}">Link {i}</a><p>Some filler text {i} for the page body</p></div>'
+                   for i in range(n))
+
+
+def page(body):
+    return ('<!DOCTYPE html><html lang="en"><head><meta charset="utf-8"><title>Data Scientist Jobs in Scotland - Indeed</title>'
+            '<script>var x = "<div class=\\"tapItem\\">";</script><style>.x{color:red}</style></head><body>'
+            + filler(300) + body + filler(300) + '</body></html>')
+
+
+def card_format0(rng):
+    jk = '%012x' % rng.getrandbits(48)
+    title, salary = rng.choice(TITLES), rng.choice(SALARIES)
+    salary_html = f'<span class="salary-snippet">{salary}</span>' if salary else ''
+    return (f'<div class="jobsearch-SerpJobCard unifiedRow row result clickcard" id="p_{jk}" data-jk="{jk}">\n'
+            f'  <h2 class="title"><a target="_blank" class="jobtitle turnstileLink" href="/rc/clk?jk={jk}&amp;fccid=abc" title="{title}">\n'
+            f'    {title}</a> <span class="new">new</span></h2>\n'
+            f'  <div class="sjcl"><div><span class="company"><a class="turnstileLink" href="/cmp/x">{rng.choice(COMPANIES)}</a></span>\n'
+            f'  <span class="ratingsDisplay"><span class="ratingsContent">4.1</span></span></div>\n'
+            f'  <span class="location accessible-contrast-color-location">{rng.choice(LOCATIONS)}</span></div>\n'
+            f'  <div class="salarySnippet">{salary_html}</div>\n'
+            f'  <div class="summary"><ul><li>Work with <b>data</b> to build models &amp; pipelines.</li><li>{rng.choice(SKILLS)}, SQL and cloud experience.</li></ul></div>\n'
+            f'  <div class="jobsearch-SerpJobCard-footer"><div class="result-link-bar"><span class="date date-a11y">{rng.randint(0, 30)} days ago</span></div></div>\n'
+            f'</div>')
+
+
+def card_format1(rng):
+    jk = '%012x' % rng.getrandbits(48)
+    title, salary = rng.choice(TITLES), rng.choice(SALARIES)
+    salary_html = f'<div class="metadata salary-snippet-container"><div class="salary-snippet">{salary}</div></div>' if salary else ''
+    return (f'<a id="job_{jk}" class="tapItem fs-unmask result resultWithShelf sponTapItem desktop" href="/rc/clk?jk={jk}&amp;from=vj" target="_blank">\n'
+            f' <div class="slider_container"><div class="slider_list"><div class="slider_item"><div class="job_seen_beacon">\n'
+            f' <table class="jobCard_mainContent"><tbody><tr><td class="resultContent">\n'
+            f' <div class="heading4 color-text-primary singleLineTitle tapItem-gutter"><h2 class="jobTitle jobTitle-color-purple jobTitle-newJob"><div class="new topLeft holisticNewBlue desktop"><span class="label">new</span></div><span title="{title}">{title}</span></h2></div>\n'
+            f' <div class="heading6 company_location tapItem-gutter"><pre><span class="companyName">{rng.choice(COMPANIES)}</span><div class="companyLocation">{rng.choice(LOCATIONS)}</div></pre></div>\n'
+            f' {salary_html}\n'
+            f' </td></tr></tbody></table>\n'
+            f' <table class="jobCardShelfContainer"><tbody><tr><td><div class="job-snippet"><ul style="list-style-type:circle"><li>Analyse data using {rng.choice(SKILLS)} &amp; Python.</li><li>Communicate insight to stakeholders.</li></ul></div>\n'
+            f' <span class="date"><span class="visually-hidden">Posted</span>Posted {rng.randint(0, 30)} days ago</span></td></tr></tbody></table>\n'
+            f' </div></div></div></div></a>')
+
+
+def description_text(rng):
+    title, location = rng.choice(TITLES), rng.choice(LOCATIONS)
+    paragraphs = []
+    for _ in range(rng.randint(3, 8)):
+        sentences = []
+        for _ in range(rng.randint(2, 5)):
+            skill, skill2, skill3 = rng.sample(SKILLS, 3)
+            sentences.append(rng.choice(SENTENCES).format(title=title, location=location,
+                                                          skill=skill, skill2=skill2, skill3=skill3))
+        paragraphs.append(' '.join(sentences))
+    return title, '\n'.join(paragraphs)
+
+
+def make_fixtures(folder=FIXTURES, n_cards=15, n_descriptions=200, seed=0):
+    rng = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+
+    cards0 = ''.join(card_format0(rng) for _ in range(n_cards))
+    with open(os.path.join(folder, 'search_format0.html'), 'w', encoding='utf-8') as f:
+        f.write(page(f'<td id="resultsCol">{cards0}</td>'))
+    cards1 = ''.join(card_format1(rng) for _ in range(n_cards))
+    with open(os.path.join(folder, 'search_format1.html'), 'w', encoding='utf-8') as f:
+        f.write(page(f'<div id="mosaic-provider-jobcards">{cards1}</div>'))
+
+    _, text = description_text(rng)
+    body = ''.join(f'<p>{escape(p)}</p>' for p in text.split('\n'))
+    with open(os.path.join(folder, 'description.html'), 'w', encoding='utf-8') as f:
+        f.write(page(f'<div id="jobDescriptionText" class="jobsearch-jobDescriptionText"><div>{body}</div></div>'))
+
+    with open(os.path.join(folder, 'descriptions.jsonl'), 'w', encoding='utf-8') as f:
+        for i in range(n_descriptions):
+            title, text = description_text(rng)
+            f.write(json.dumps({'id': i, 'title': title, 'description': text}) + '\n')
+    print(f'Fixtures written to {folder}')
+
+
+if __name__ == '__main__':
+    make_fixtures()
@@ -0,0 +1,232 @@
+'''Offline benchmarks for the scraper parsing, tokenisation and classifier inference.
+
+Runs against the fixtures in benchmarks/fixtures (see make_fixtures.py), no network needed.
+Results are saved as JSON, and can be compared against an earlier run:
+
+    python benchmarks/run_benchmarks.py -o results.json
+    python benchmarks/run_benchmarks.py -o new.json --baseline results.json
+
+Sections which can't run here (e.g. NLTK data or clf.pkl can't be loaded) are reported
+with their error and skipped, rather than stopping the whole run.
+'''
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(ROOT, 'benchmarks', 'fixtures')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'app'))
+
+BASE_URL = 'https://uk.indeed.com'
+
+
+def timeit(fn, repeat):
+    '''Seconds taken by each of repeat calls of fn'''
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t)
+    return np.array(times)
+
+
+def timeit_each(fn, items):
+    times = []
+    for item in items:
+        t = time.perf_counter()
+        fn(item)
+        times.append(time.perf_counter() - t)
+    return np.array(times)
+
+
+def latency(times):
+    return {'p50_ms': float(np.percentile(times, 50) * 1000),
+            'p99_ms': float(np.percentile(times, 99) * 1000),
+            'mean_ms': float(times.mean() * 1000)}
+
+
+def peak_memory(fn):
+    '''Run fn once under tracemalloc, returns (result, peak MB allocated)'''
+    tracemalloc.start()
+    try:
+        result = fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, peak / 1e6
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), 'rb') as f:
+        return f.read()
+
+
+def load_descriptions(n=None):
+    with open(os.path.join(FIXTURES, 'descriptions.jsonl'), 'r', encoding='utf-8') as f:
+        docs = [json.loads(line)['description'] for line in f if line.strip()]
+    return docs[:n] if n else docs
+
+
+def bench_parse(repeat):
+    from indeed import parsers
+    results = dict()
+    for page_format in [0, 1]:
+        content = read_fixture(f'search_format{page_format}.html')
+        for engine in parsers.ENGINES:
+            try:
+                cards = parsers.parse_search_page(content, BASE_URL, engine=engine)
+            except ImportError as e:
+                results[f'search_format{page_format}/{engine}'] = {'error': str(e)}
+                continue
+            times = timeit(lambda: parsers.parse_search_page(content, BASE_URL, engine=engine), repeat)
+            _, peak = peak_memory(lambda: parsers.parse_search_page(content, BASE_URL, engine=engine))
+            results[f'search_format{page_format}/{engine}'] = dict(
+                pages_per_sec=float(1 / times.mean()),
+                cards_per_sec=float(len(cards) / times.mean()),
+                peak_mb=peak, **latency(times))
+
+    content = read_fixture('description.html')
+    for engine in parsers.ENGINES:
+        try:
+            parsers.parse_description(content, engine=engine)
+        except ImportError as e:
+            results[f'description/{engine}'] = {'error': str(e)}
+            continue
+        times = timeit(lambda: parsers.parse_description(content, engine=engine), repeat)
+        results[f'description/{engine}'] = dict(pages_per_sec=float(1 / times.mean()), **latency(times))
+    return results
+
+
+def bench_tokenize(docs):
+    import clf_funcs
+    # Warm up once so NLTK's lazy corpus loading isn't counted
+    clf_funcs.tokenize_doc(docs[0])
+    clf_funcs.lemmatize_word.cache_clear()
+
+    # Timed without tracemalloc, which slows down every allocation.  Memory is a separate run,
+    # starting from the same cold lemma cache
+    t = time.perf_counter()
+    tokens = [clf_funcs.tokenize_doc(doc) for doc in docs]
+    elapsed = time.perf_counter() - t
+    clf_funcs.lemmatize_word.cache_clear()
+    _, peak = peak_memory(lambda: [clf_funcs.tokenize_doc(doc) for doc in docs])
+    return {'tokenize_doc': {'docs_per_sec': len(docs) / elapsed, 'seconds': elapsed, 'peak_mb': peak,
+                             'tokens_per_doc': float(np.mean([len(t) for t in tokens]))}}
+
+
+def bench_model(model, docs, repeat, single_docs):
+    from clf_funcs import predict_with_proba
+    from model_artifact import load_model
+
+    results = dict()
+    t = time.perf_counter()
+    clf = load_model(model)
+    elapsed = time.perf_counter() - t
+    _, peak = peak_memory(lambda: load_model(model))
+    results['load'] = {'seconds': elapsed, 'peak_mb': peak}
+
+    # TF-IDF on pre-tokenised docs, so this is the vectoriser alone
+    if hasattr(clf, 'named_steps'):
+        tokens = clf['preprocess'].transform(docs)
+        times = timeit(lambda: clf['tfidf'].transform(tokens), repeat)
+    else:
+        tokens = clf.preprocessor.transform(docs)
+        times = timeit(lambda: clf.vectorize(tokens), repeat)
+    results['tfidf_transform'] = dict(docs_per_sec=float(len(docs) / times.mean()), **latency(times))
+
+    single = timeit_each(lambda doc: predict_with_proba(clf, [doc]), docs[:single_docs])
+    results['predict_single'] = latency(single)
+
+    batch = timeit(lambda: predict_with_proba(clf, docs), repeat)
+    _, peak = peak_memory(lambda: predict_with_proba(clf, docs))
+    results['predict_batch'] = dict(batch_size=len(docs), docs_per_sec=float(len(docs) / batch.mean()),
+                                    peak_mb=peak, **latency(batch))
+    return results
+
+
+def run(model, repeat=20, n_docs=None, single_docs=100):
+    docs = load_descriptions(n_docs)
+    report = {'meta': {'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+                       'python': platform.python_version(),
+                       'platform': platform.platform(),
+                       'repeat': repeat,
+                       'n_docs': len(docs),
+                       'model': model},
+              'results': dict()}
+
+    sections = [('parse', lambda: bench_parse(repeat)),
+                ('tokenize', lambda: bench_tokenize(docs)),
+                ('model', lambda: bench_model(model, docs, repeat, single_docs))]
+    for name, fn in sections:
+        print(f'Running {name} benchmarks')
+        try:
+            report['results'][name] = fn()
+        except Exception as e:
+            error = f'{type(e).__name__}: ' + ' '.join(str(e).split())
+            print(f'  skipped: {error}')
+            report['results'][name] = {'error': error}
+
+    try:
+        import resource
+        report['meta']['max_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except ImportError:
+        pass  # not available on Windows
+    return report
+
+
+def flatten(results, prefix=''):
+    flat = dict()
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f'{prefix}{key}.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[prefix + key] = value
+    return flat
+
+
+def compare(report, baseline):
+    '''Print each metric against the baseline run, returns {metric: ratio new/old}'''
+    new, old = flatten(report['results']), flatten(baseline['results'])
+    ratios = dict()
+    print(f'{"metric":<60} {"baseline":>12} {"new":>12} {"change":>8}')
+    for key in sorted(set(new) & set(old)):
+        if old[key] == 0:
+            continue
+        ratio = new[key] / old[key]
+        ratios[key] = ratio
+        # Throughput is better higher, times and memory are better lower
+        better = ratio > 1 if key.endswith('_per_sec') else ratio < 1
+        flag = '' if abs(ratio - 1) < 0.05 else (' better' if better else ' WORSE')
+        print(f'{key:<60} {old[key]:>12.3f} {new[key]:>12.3f} {(ratio-1)*100:>+7.1f}%{flag}')
+    return ratios
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the offline benchmarks')
+    parser.add_argument('-o', '--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', default=None, help='earlier results .json to compare against')
+    parser.add_argument('--model', default=os.path.join(ROOT, 'clf.pkl'), help='pickled pipeline or artifact folder')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--n-docs', type=int, default=None, help='use only the first n sample descriptions')
+    parser.add_argument('--single-docs', type=int, default=100, help='docs timed one at a time for predict latency')
+    args = parser.parse_args()
+
+    report = run(args.model, repeat=args.repeat, n_docs=args.n_docs, single_docs=args.single_docs)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Results saved to {args.output}')
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            compare(report, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,26 +1,47 @@
-import requests
-from bs4 import BeautifulSoup
 import pandas as pd
-import time
-import re
 import logging
 import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-# Create a custom logger
-logger = logging.getLogger(__name__)
+try:
+    from .fetch import Fetcher, ResponseCache, default_fetcher
+    from .metrics import COUNT_BUCKETS, Metrics
+    from .parsers import parse_description, parse_search_page
+    from .ratelimit import make_limiter
+    from .records import RecordBuffer
+    from .seen_index import SeenIndex
+    from .storage import save_parquet
+    from .scheduler import WorkQueue
+except ImportError:
+    from fetch import Fetcher, ResponseCache, default_fetcher
+    from metrics import COUNT_BUCKETS, Metrics
+    from parsers import parse_description, parse_search_page
+    from ratelimit import make_limiter
+    from records import RecordBuffer
+    from seen_index import SeenIndex
+    from storage import save_parquet
+    from scheduler import WorkQueue
 
-# Create handlers
-c_handler = logging.StreamHandler()
-f_handler = logging.FileHandler('file.log')
+# Create a custom logger, handlers are only added by setup_logging()
+logger = logging.getLogger(__name__)
 
-# Create formatters and add it to handlers
-c_handler.setFormatter(logging.Formatter('[%(levelname)s]%(message)s'))
-f_handler.setFormatter(logging.Formatter('[%(asctime)s:%(name)s:%(levelname)s]%(message)s'))
 
-# Add handlers to the logger
-logger.addHandler(c_handler)
-logger.addHandler(f_handler)
-logger.setLevel(logging.DEBUG)
+def setup_logging(level=logging.INFO, log_file='file.log'):
+    '''Log to the console and to log_file (None for console only).
+    Safe to call more than once, handlers are only added the first time.
+    Use level=logging.DEBUG to also log every job card'''
+    if not logger.handlers:
+        # Create handlers
+        c_handler = logging.StreamHandler()
+        c_handler.setFormatter(logging.Formatter('[%(levelname)s]%(message)s'))
+        logger.addHandler(c_handler)
+        if log_file is not None:
+            f_handler = logging.FileHandler(log_file)
+            f_handler.setFormatter(logging.Formatter('[%(asctime)s:%(name)s:%(levelname)s]%(message)s'))
+            logger.addHandler(f_handler)
+    logger.setLevel(level)
 
 
 def get_url_page(url_start, page):
@@ -37,155 +58,246 @@ def get_title(title):
         raise Exception('title must be str type')
     return title
 
-def get_job_search(url, base_url, headers, verbose=True):
-    page = requests.get(url, headers=headers)
-    soup = BeautifulSoup(page.content, 'html.parser')
-
-    # Extract list of jobcards
-    jobcards = soup.find_all(class_='jobsearch-SerpJobCard')
-    df_page = pd.DataFrame()
-
-    if len(jobcards) > 0:
-        # Loop through each job result listed on page
-        for i, card in enumerate(jobcards):
-            # if j > 1: break
-
-            card_title = card.find(class_='jobtitle')
-            card_title_str = card_title.text.strip()
-            card_url = base_url + card_title['href']
-
-            card_id = card['id']
-            # card_id = re.sub(r'job_|sj_|p_|pj_','',card_id)
-            card_id = re.sub(r'.*_','',card_id)
-
-            card_company = card.find('span', class_='company')
-            card_company_str = card_company.text.strip()
-
-            card_loc = card.find(class_='location')
-            card_loc_str = card_loc.text.strip()
-
-            card_salary = card.find(class_='salary-snippet')
-            card_salary_str = card_salary.text.strip() if card_salary is not None else ''
-
-            card_summary = card.find(class_='summary')
-            card_summary_str = card_summary.text.strip()
-
-            card_date = card.find(class_='date')
-            card_date_str = card_date.text.strip()
-               
-            card_title_short = card_title_str[0:20] if len(card_title_str)>20 else card_title_str
-            if verbose: print(f'job:{i:2} title:{card_title_short:<20}... company:{card_company_str}')
-            logger.debug(f'job:{i:2} title:{card_title_short:<20}... company:{card_company_str}')
-
-            df_page = df_page.append({
-                'title': card_title_str,
-                'id': card_id,
-                'company': card_company_str,
-                'url': card_url,
-                'salary': card_salary_str,
-                'location': card_loc_str,
-                'summary': card_summary_str,
-                'date': card_date_str,
-                'page_format': 0
-            }, ignore_index=True)
-    else:
-        # Use this routine if the alternative page format is received.  
-        # Haven't worked out why there are 2 formats yet, works either way
-        jobcards = soup.find_all(class_='tapItem')
-        
-        for i, card in enumerate(jobcards):
-            card_url = base_url + card['href']
-            
-            card_title = card.find(class_='jobTitle')
-            card_title_str = card_title.text.strip()
-            
-            card_id = card['id']
-            # card_id = re.sub(r'job_|sj_|p_|pj_','',card_id)
-            card_id = re.sub(r'.*_','',card_id)
+def get_job_search(url, base_url, headers, verbose=False, fetcher=None, engine=None):
+    '''Scrape one search results page, returns a list of dicts (one per job card).
+    A line per card is printed with verbose=True, and logged only at DEBUG level'''
+    fetcher = fetcher or default_fetcher
+    page = fetcher.get(url, headers=headers)
+    page.raise_for_status()
+    with fetcher.metrics.timer('parse_seconds', kind='search'):
+        cards = parse_search_page(page.content, base_url, engine=engine)
+    fetcher.metrics.observe('cards_per_page', len(cards), buckets=COUNT_BUCKETS)
 
-            card_company = card.find(class_='companyName')
-            card_company_str = card_company.text.strip()
-            
-            card_loc = card.find(class_='companyLocation')
-            card_loc_str = card_loc.text.strip()
-            
-            card_salary = card.find(class_='salary-snippet')
-            card_salary_str = card_salary.text.strip() if card_salary is not None else ''
-            
-            card_summary = card.find(class_='job-snippet')
-            card_summary_str = card_summary.text.strip()
-            
-            card_date = card.find(class_='date')
-            card_date_str = card_date.text.strip()
-            
-            card_title_short = card_title_str[0:20] if len(card_title_str)>20 else card_title_str
-            if verbose: print(f'job:{i:2} title:{card_title_short:<20}... company:{card_company_str}')
-            logger.debug(f'job:{i:2} title:{card_title_short:<20}... company:{card_company_str}')
-            
-            df_page = df_page.append({
-                'title': card_title_str,
-                'id': card_id,
-                'company': card_company_str,
-                'url': card_url,
-                'salary': card_salary_str,
-                'location': card_loc_str,
-                'summary': card_summary_str,
-                'date': card_date_str,
-                'page_format':1
-            }, ignore_index=True)
-            
-        # output file for debugging
-        # html = soup.prettify("utf-8")
-        # with open('failedpage.html', 'wb') as file:
-        #     file.write(html)
-    return df_page
-
-def get_job_description(url, headers):
-    page = requests.get(url, headers=headers)
-    soup = BeautifulSoup(page.content, 'html.parser')
-    
-    description_html = soup.find(id='jobDescriptionText')
-    description_str = description_html.text.strip()
+    if verbose or logger.isEnabledFor(logging.DEBUG):
+        for i, card in enumerate(cards):
+            card_title_short = card['title'][0:20] if len(card['title'])>20 else card['title']
+            if verbose: print(f'job:{i:2} title:{card_title_short:<20}... company:{card["company"]}')
+            logger.debug(f'job:{i:2} title:{card_title_short:<20}... company:{card["company"]}')
+    return cards
+
+def get_job_description(url, headers, fetcher=None, engine=None):
+    fetcher = fetcher or default_fetcher
+    page = fetcher.get(url, headers=headers)
+    page.raise_for_status()
     
-    descr = {'description':description_str,
-             'description_html':str(description_html)}         
+    with fetcher.metrics.timer('parse_seconds', kind='description'):
+        descr = parse_description(page.content, engine=engine)
+    if descr is None:
+        # Probably a block page: back off like for a blank search page, and don't keep serving it from the cache
+        fetcher.report(url, blank=True)
+        fetcher.discard(url)
+        raise ValueError(f'No job description found at {url}')
     return descr
 
-def batch_scrape(queries, pages=5, delay=5, append=False, f_name='data.csv', verbose=False):
-    for i, query in enumerate(queries):
-        print(f'Looping through query: "{query[0]}" in "{query[1]}"')
-        logger.info(f'Looping through query: "{query[0]}" in "{query[1]}"')
-        
-        scraper = SearchPageScraper(query[0], query[1], delay=delay)
-        scraper.scrape(pages, verbose=verbose)
+# Outcome of fetching a single job description
+DescriptionResult = namedtuple('DescriptionResult',
+                               ['index', 'url', 'ok', 'description', 'description_html', 'error'])
+
+def fetch_description(index, url, headers, fetcher=None, engine=None):
+    '''Fetch one job description.
+    Never raises, failures are reported in the returned DescriptionResult'''
+    metrics = (fetcher or default_fetcher).metrics
+    try:
+        descr = get_job_description(url, headers, fetcher=fetcher, engine=engine)
+    except Exception as e:
+        metrics.inc('descriptions_total', result='failed')
+        return DescriptionResult(index, url, False, '', '', repr(e))
+    metrics.inc('descriptions_total', result='ok')
+    return DescriptionResult(index, url, True, descr['description'], descr['description_html'], None)
 
-        scraper.add_descriptions()    
+def fetch_descriptions(jobs, headers, fetcher=None, workers=1, engine=None):
+    '''Fetch descriptions for a list of (index, url) tuples.
+    With workers > 1 requests are issued from a bounded thread pool so network latency
+    overlaps, while the fetcher's limiter keeps the overall request rate under its ceiling.
+    Yields a DescriptionResult per url as each one completes'''
+    if workers <= 1:
+        for index, url in jobs:
+            yield fetch_description(index, url, headers, fetcher, engine)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(fetch_description, index, url, headers, fetcher, engine) 
+                       for index, url in jobs]
+            for future in as_completed(futures):
+                yield future.result()
+
+class _ClaimedIds:
+    '''Job ids whose description a query of the batch has taken on fetching, so overlapping
+    queries running at the same time don't fetch it again before it's saved to the SeenIndex'''
+    def __init__(self):
+        self.ids = set()
+        self.lock = threading.Lock()
+
+    def claim(self, job_ids):
+        '''Claim job_ids, returns the ones another query had already claimed'''
+        job_ids = set(job_ids)
+        with self.lock:
+            taken = job_ids & self.ids
+            self.ids.update(job_ids)
+        return taken
+
+class _PendingDescriptions:
+    '''Collects description results for one query until all of them are in'''
+    def __init__(self, count):
+        self.count = count
+        self.results = []
+        self.lock = threading.Lock()
+
+    def add(self, result):
+        '''Returns True once the last outstanding result has been added'''
+        with self.lock:
+            self.results.append(result)
+            self.count = self.count - 1
+            return self.count == 0
+
+def batch_scrape(queries, pages=5, delay=5, append=False, f_name='data.csv', verbose=False, 
+                 workers=1, rate=None, cache_dir=None, cache_ttl=None, replay=False, seen_index=None,
+                 format='csv', metrics_file=None, adaptive=True, max_delay=60):
+    '''Scrape a list of (title, location) queries into data/f_name.
+    Every query is broken into search-page and description tasks on one shared work queue,
+    so up to `workers` requests are in flight at once.  All of them draw from a single
+    rate limiter, `rate` requests per second in total (default one request per `delay` seconds).
+    With adaptive=True that rate is a ceiling: requests slow down (to at most one per
+    max_delay seconds) and back off with jitter on 429/5xx responses and blank pages,
+    then speed back up once the server recovers.  adaptive=False keeps a fixed rate.
+    Each query is written to the file as soon as it finishes.
+    With cache_dir set, responses are cached on disk (for cache_ttl seconds) and replay=True
+    re-runs the whole batch offline from the cache.
+    seen_index is the path of a SeenIndex shared across runs, ads already saved with a
+    description by an earlier query or run are skipped.
+    format='parquet' writes a partitioned Parquet dataset into the folder data/<f_name without extension>
+    instead, see storage.py.
+    Request, parse and sleep timings, retries, blank pages etc. are collected in a Metrics
+    for the batch (returned), and written to metrics_file at the end: a Prometheus textfile
+    if it ends in .prom, JSON otherwise (default data/<f_name without extension>_metrics.json)'''
+    if not os.path.isdir('data'):
+        os.mkdir('data')
+    if format == 'parquet':
+        f_name = os.path.splitext(f_name)[0]
+    f_path = os.path.join('data', f_name)
+
+    if rate is None and delay > 0:
+        rate = 1 / delay
+    cache = ResponseCache(cache_dir, ttl=cache_ttl) if cache_dir is not None else None
+    metrics = Metrics()
+    fetcher = Fetcher(cache=cache, mode='replay' if replay else 'online',
+                      limiter=make_limiter(rate, adaptive=adaptive, max_interval=max_delay), metrics=metrics)
+    seen = SeenIndex(seen_index) if seen_index is not None else None
+    if seen is not None and not append:
+        # Each run only holds ads the index hasn't seen, overwriting would lose everything saved before
+        append = format == 'parquet' or os.path.isfile(f_path)
+        if append: logger.info(f'Appending to {f_path} as seen_index is set')
+    claimed = _ClaimedIds()
+    work = WorkQueue(workers)
+    write_lock = threading.Lock()
+    write_state = {'append': append}
+
+    def scrape_page_task(scraper, page):
+        try:
+            carry_on = scraper.scrape_page(page, verbose=verbose)
+        except Exception:
+            logger.exception(f'Page {page+1} failed for [{scraper.title}] in [{scraper.loc}]')
+            carry_on = False
+        if carry_on and page+1 < pages:
+            work.submit(scrape_page_task, scraper, page+1)
+            return
+
+        # Search pages done, queue up a task per description
+        scraper.skip_seen()
+        scraper.skip_ids(claimed.claim(scraper.pending_ids()), 'already being fetched by another query')
+        jobs = scraper.pending_descriptions()
+        if len(jobs) == 0:
+            finish_query(scraper, [])
+            return
+        pending = _PendingDescriptions(len(jobs))
+        for index, url in jobs:
+            work.submit(description_task, scraper, index, url, pending)
+
+    def description_task(scraper, index, url, pending):
+        result = fetch_description(index, url, scraper.headers, fetcher, scraper.parser)
+        if pending.add(result):
+            finish_query(scraper, pending.results)
+
+    def finish_query(scraper, results):
+        for result in results:
+            scraper.apply_description(result, verbose=verbose)
+        logger.info(f'{len(scraper.records)} entries scraped for [{scraper.title}] in [{scraper.loc}]')
+        if len(scraper.records) == 0:
+            return
         scraper.drop_duplicates()
-        
-        if i == 0 and not append:
-            if not os.path.isdir('data'):
-                os.mkdir('data')
-            scraper.save(os.path.join('data',f_name), append=False)
-        else:
-            scraper.save(os.path.join('data',f_name), append=True)
-    return
+
+        with write_lock:
+            if format == 'parquet':
+                # Each query writes its own partition, so append applies per query
+                scraper.save(f_path, append=append, format=format)
+            else:
+                scraper.save(f_path, append=write_state['append'])
+                write_state['append'] = True
+
+    for query in queries:
+        print(f'Queueing query: "{query[0]}" in "{query[1]}"')
+        logger.info(f'Queueing query: "{query[0]}" in "{query[1]}"')
+        scraper = SearchPageScraper(query[0], query[1], delay=delay, fetcher=fetcher, seen_index=seen)
+        work.submit(scrape_page_task, scraper, 0)
+
+    errors = work.run()
+    if errors:
+        logger.warning(f'{len(errors)} tasks failed during batch scrape')
+        metrics.inc('task_errors_total', len(errors))
+    if seen is not None:
+        seen.close()
+
+    if metrics_file is None:
+        metrics_file = os.path.splitext(f_path)[0] + '_metrics.json'
+    metrics.export(metrics_file)
+    print(metrics.summary())
+    logger.info(f'Metrics saved to {metrics_file}')
+    return metrics
 
 
 class SearchPageScraper:
     base_url = 'https://uk.indeed.com'
     base_url_jobs = '/jobs?'
     
-    def __init__(self, title, loc, delay=1):
+    def __init__(self, title, loc, delay=1, rate=None, fetcher=None, seen_index=None, parser=None,
+                 adaptive=True, max_delay=60):
         self.title = get_title(title)
         self.loc = loc
-        self.df = pd.DataFrame(columns=['title','id','company','url','location','summary',
-                                        'date', 'description', 'description_html'])
+        self.records = RecordBuffer(['title','id','company','url','location','summary',
+                                     'date', 'description', 'description_html'])
+        self.id_index = dict()  # job id -> position of its first row in self.records
+        self.skipped_ids = set()  # ids left out as the SeenIndex already has them
         self.url = f'{self.base_url}{self.base_url_jobs}q={self.title}&l={self.loc}'
         self.headers = {'Uer-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.114 Safari/537.36'}
         self.pages_scraped = 0
         self.descriptions_scraped = 0
         self.delay = delay
         
+        # Requests per second ceiling, defaults to one request per delay (see batch_scrape for adaptive).
+        # A fetcher can be shared between scrapers so they draw from one budget and cache
+        if fetcher is None:
+            if rate is None and delay > 0:
+                rate = 1 / delay
+            fetcher = Fetcher(limiter=make_limiter(rate, adaptive=adaptive, max_interval=max_delay))
+        self.fetcher = fetcher
+        self.seen_index = seen_index
+        self.parser = parser  # parsers engine name, None for the default
+        self.description_results = []
+
+    @property
+    def df(self):
+        '''Scraped data as a DataFrame, built from self.records on demand'''
+        return self.records.to_frame()
+
+    @df.setter
+    def df(self, df):
+        self.records = RecordBuffer.from_frame(df)
+        self.rebuild_id_index()
+
+    def rebuild_id_index(self):
+        self.id_index = dict()
+        for i, job_id in enumerate(self.records.column('id')):
+            self.id_index.setdefault(job_id, i)
+        
     def new_search(self, title, loc):
         self.title = get_title(title)
         self.loc = loc
@@ -196,64 +308,97 @@ class SearchPageScraper:
         logger.debug('Input validation not written yet')
     
     def __repr__(self):
-        if self.df.empty:
+        if len(self.records) == 0:
             repr = (f'IndeedScraper(title="{self.title}", loc="{self.loc}")\n'
                     f'  - Empty df, no results loaded')
         else:
             repr = (f'IndeedScraper(title="{self.title}", loc="{self.loc}")\n'
-                    f'  - {len(self.df)} jobs scraped from {self.pages_scraped} pages')
+                    f'  - {len(self.records)} jobs scraped from {self.pages_scraped} pages')
         return repr
         
-    def scrape(self, num_pages=1, attempts=3, verbose=True):
+    @property
+    def metrics(self):
+        '''The Metrics this scraper's requests are recorded in'''
+        return self.fetcher.metrics
+
+    def scrape(self, num_pages=1, attempts=3, verbose=False):
         print(f'Running scraper for [{self.title}] in [{self.loc}]')
         logger.info(f'Running scraper for [{self.title}] in [{self.loc}]')
         
-        for i in range(0, num_pages):
-            # if i>0: break
-
-            # Retry if blank result
-            attempt_success = False
-            retrying = ''
-            for attempt in range(attempts):
-                url_page = get_url_page(self.url, i)
-                
-                if retrying == '':
-                    print(f'\nPage:{i+1} url:{url_page}')
-                    logger.info(f'Scraping page:{i+1} url:{url_page}')
-                else:
-                    print(retrying)
-                    logger.info(retrying)
-                
-                # Request page
-                time.sleep(self.delay)
-                try:
-                    df_page = get_job_search(url_page, self.base_url, self.headers, verbose=verbose)
-                except:
-                    df_page = pd.DataFrame()
-                    logger.warning('Failed to scrape this page')
-
-                if df_page.empty:
-                    retrying = f'Blank result, retrying ({attempt+1} of {attempts} attempts)'
-                    continue
-                else:
-                    attempt_success = True
-                    df_page['query_title'] = self.title
-                    df_page['query_loc'] = self.loc
+        with self.metrics.timer('phase_seconds', phase='scrape'):
+            for i in range(0, num_pages):
+                # if i>0: break
+                if not self.scrape_page(i, attempts=attempts, verbose=verbose):
                     break
+        logger.info(f'{len(self.records)} entries scraped from {i} pages (out of {num_pages})') 
+
+    def scrape_page(self, i, attempts=3, verbose=False):
+        '''Scrape search page i (retrying blank results) and add its jobs to self.df.
+        Returns False once the scraper should stop, i.e. this page was all duplicates'''
+        # Retry if blank result
+        attempt_success = False
+        retrying = ''
+        for attempt in range(attempts):
+            url_page = get_url_page(self.url, i)
             
-            if attempt_success:
-                self.pages_scraped = self.pages_scraped + 1
-                this_id_list = df_page.id.values.tolist()
-                id_duplicates = [any(self.df.id.str.contains(x)) for x in this_id_list]
-                # if verbose: print(id_duplicates)
-                
-                self.df = self.df.append(df_page, ignore_index=True)
-                
-                if all(id_duplicates):
-                    print(f'Stopping scraper as this page found {sum(id_duplicates)} duplicates (of {len(id_duplicates)} on this page)')
-                    logger.info(f'Stopping scraper as this page found {sum(id_duplicates)} duplicates (of {len(id_duplicates)} on this page)')
-                    break   
-        logger.info(f'{len(self.df)} entries scraped from {i} pages (out of {num_pages})') 
+            if retrying == '':
+                print(f'\nPage:{i+1} url:{url_page}')
+                logger.info(f'Scraping page:{i+1} url:{url_page}')
+            else:
+                print(retrying)
+                logger.info(retrying)
+                self.metrics.inc('retries_total')
+            
+            # Request page
+            blank = False
+            try:
+                cards = get_job_search(url_page, self.base_url, self.headers, verbose=verbose, 
+                                       fetcher=self.fetcher, engine=self.parser)
+                blank = len(cards) == 0
+            except:
+                cards = []
+                logger.warning('Failed to scrape this page')
+
+            if len(cards) == 0:
+                self.metrics.inc('blank_pages_total')
+                # Lets an adaptive limiter back off before the retry.  429/5xx and request
+                # errors were already reported by the fetcher, only a 200 without results is left
+                if blank:
+                    self.fetcher.report(url_page, blank=True)
+                # The blank page was cached as a 200, drop it so the retry really re-fetches
+                self.fetcher.discard(url_page)
+                retrying = f'Blank result, retrying ({attempt+1} of {attempts} attempts)'
+                continue
+            else:
+                attempt_success = True
+                for card in cards:
+                    card['query_title'] = self.title
+                    card['query_loc'] = self.loc
+                break
+        
+        if attempt_success:
+            self.pages_scraped = self.pages_scraped + 1
+            self.metrics.inc('pages_total')
+            this_id_list = [card['id'] for card in cards]
+            id_duplicates = [x in self.id_index or x in self.skipped_ids for x in this_id_list]
+            # if verbose: print(id_duplicates)
+
+            # Leave out ads which earlier runs already saved with a description
+            if self.seen_index is not None:
+                seen_ids = self.seen_index.seen(this_id_list)
+                self.skipped_ids.update(seen_ids)
+                cards = [card for card in cards if card['id'] not in seen_ids]
+                logger.info(f'{len(cards)} new jobs on this page ({len(seen_ids)} seen in earlier runs)')
+            
+            for card in cards:
+                self.id_index.setdefault(card['id'], len(self.records))
+                self.records.append(card)
+            
+            if all(id_duplicates):
+                print(f'Stopping scraper as this page found {sum(id_duplicates)} duplicates (of {len(id_duplicates)} on this page)')
+                logger.info(f'Stopping scraper as this page found {sum(id_duplicates)} duplicates (of {len(id_duplicates)} on this page)')
+                return False
+        return True
     
     def new_query(self, title, loc):
         self.title = get_title(title)
@@ -261,42 +406,98 @@ class SearchPageScraper:
         self.url = f'{self.base_url}{self.base_url_jobs}q={self.title}&l={self.loc}'
         
     def drop_duplicates(self):
-        print(f'{len(self.df)} rows before dropping duplicates')
-        logger.info(f'{len(self.df)} rows before dropping duplicates')
-        self.df = self.df.drop_duplicates('id')
-        self.df = self.df.reset_index(drop=True)
-        print(f'{len(self.df)} rows after dropping duplicates')
-        logger.info(f'{len(self.df)} rows after dropping duplicates')
+        print(f'{len(self.records)} rows before dropping duplicates')
+        logger.info(f'{len(self.records)} rows before dropping duplicates')
+        # Keep the first row for each id, the index already knows where it is
+        keep = sorted(self.id_index.values())
+        self.records = self.records.take(keep)
+        self.id_index = {job_id: i for i, job_id in enumerate(self.records.column('id'))}
+        print(f'{len(self.records)} rows after dropping duplicates')
+        logger.info(f'{len(self.records)} rows after dropping duplicates')
+
+    def skip_seen(self):
+        '''Drop rows still missing a description whose id the SeenIndex already has
+        (e.g. saved by another query of the same batch since this page was scraped)'''
+        if self.seen_index is None or len(self.records) == 0:
+            return 0
+        seen_ids = self.seen_index.seen(self.pending_ids())
+        return self.skip_ids(seen_ids, 'already saved by an earlier query')
+
+    def pending_ids(self):
+        '''Ids of the rows which don't have a description yet'''
+        ids = self.records.column('id')
+        descriptions = self.records.column('description')
+        return [job_id for job_id, descr in zip(ids, descriptions) if pd.isna(descr)]
+
+    def skip_ids(self, skip, reason):
+        '''Drop rows still missing a description whose id is in skip'''
+        if len(skip) == 0:
+            return 0
+        ids = self.records.column('id')
+        descriptions = self.records.column('description')
+        keep = [i for i, (job_id, descr) in enumerate(zip(ids, descriptions)) 
+                if not (job_id in skip and pd.isna(descr))]
+        self.records = self.records.take(keep)
+        self.rebuild_id_index()
+        self.skipped_ids.update(skip)
+        logger.info(f'{len(skip)} jobs skipped, {reason}')
+        return len(skip)
+        
+    def pending_descriptions(self):
+        '''List of (index, url) for rows which don't have a description yet.
+        Only the first row of each id is included, the rest go in drop_duplicates()'''
+        ids = self.records.column('id')
+        urls = self.records.column('url')
+        descriptions = self.records.column('description')
+        return [(i, url) for i, (job_id, url, descr) in enumerate(zip(ids, urls, descriptions))
+                if pd.isna(descr) and self.id_index.get(job_id) == i]
+
+    def apply_description(self, result, verbose=False):
+        '''Write a DescriptionResult into its row of self.df'''
+        i = result.index
+        company = self.records.get(i, 'company')
+        comp_name = company[:10] if len(company)>10 else company
+        if result.ok:
+            if verbose: print(f'desc:{i:2} {comp_name:<10}... description added ({len(result.description)} characters)')
+            logger.debug(f'desc:{i:2} {comp_name:<10}... description added ({len(result.description)} characters)')
+        else:
+            if verbose: print(f'desc:{i:2} {comp_name:<10}... FAILED to read description ({result.error})')
+            logger.warning(f'desc:{i:2} {comp_name:<10}... FAILED to read description ({result.error})')
         
-    def add_descriptions(self, verbose=False):
-        if self.df.empty:
+        self.records.set(i, 'description', result.description)
+        self.records.set(i, 'description_html', result.description_html)
+        
+        self.descriptions_scraped = self.descriptions_scraped+1
+        self.description_results.append(result)
+
+    def add_descriptions(self, verbose=False, workers=1):
+        if len(self.records) == 0:
             raise Exception('No existing scraped data.  First use .scrape() method')
         
-        for i, row in self.df.iterrows():   
-            comp_name = row.company[:10] if len(row.company)>10 else row.company
-            if not pd.isna(row.description):
-                if verbose: print(f'desc:{i:2} {comp_name:<10}... description already added, skipping')
-                logger.info(f'desc:{i:2} {comp_name:<10}... description already added, skipping')
-                continue
-            else:
-                time.sleep(self.delay)
-                try:
-                    descr_dict = get_job_description(row.url, self.headers)
-                    if verbose: print(f'desc:{i:2} {comp_name:<10}... description added ({len(descr_dict["description"])} characters)')
-                    logger.info(f'desc:{i:2} {comp_name:<10}... description added ({len(descr_dict["description"])} characters)')    
-                except:
-                    descr = {'description': '',
-                             'description_html': ''}
-                    logger.info(f'desc:{i:2} {comp_name:<10}... FAILED to read description ({len(descr_dict["description"])} characters)')    
-                    
-
-                self.df.iloc[self.df.index[i], self.df.columns.get_loc('description')] = descr_dict['description']
-                self.df.iloc[self.df.index[i], self.df.columns.get_loc('description_html')] = descr_dict['description_html']
-                
-                self.descriptions_scraped = self.descriptions_scraped+1
+        self.skip_seen()
+        jobs = self.pending_descriptions()
+        skipped = len(self.records) - len(jobs)
+        if verbose: print(f'{skipped} descriptions already added, skipping')
+        logger.info(f'{skipped} descriptions already added, skipping')
+        
+        results = []
+        with self.metrics.timer('phase_seconds', phase='add_descriptions'):
+            for result in fetch_descriptions(jobs, self.headers, fetcher=self.fetcher, workers=workers,
+                                             engine=self.parser):
+                self.apply_description(result, verbose=verbose)
+                results.append(result)
+        
+        failed = sum(not r.ok for r in results)
+        logger.info(f'{len(results)-failed} descriptions added, {failed} failed')
+        return results
                 
-    def save(self, f_name, append=False):
-        if append:
+    def save(self, f_name, append=False, format='csv'):
+        if format == 'parquet':
+            # f_name is the dataset folder, append=False replaces today's partition for this query
+            save_parquet(self.df, f_name, overwrite=not append)
+            print(f'Data saved to {f_name} (parquet)')
+            logger.info(f'Data saved to {f_name} (parquet)')
+        elif append:
             self.df.to_csv(f_name, index=True, mode='a', header=False)
             print(f'Data appended to {f_name}')
             logger.info(f'Data appended to {f_name}')
@@ -305,5 +506,12 @@ class SearchPageScraper:
             print(f'Data saved to {f_name}')
             logger.info(f'Data saved to {f_name}')
 
+        # Only now are the descriptions safely on disk, so later runs can skip them
+        if self.seen_index is not None:
+            ids = self.records.column('id')
+            descriptions = self.records.column('description')
+            self.seen_index.add([job_id for job_id, descr in zip(ids, descriptions) 
+                                 if not pd.isna(descr) and descr != ''], query_title=self.title)
+
         
             
\ No newline at end of file
@@ -1,5 +1,7 @@
 import IndeedScraper as ind
 
+ind.setup_logging()
+
 # ind.batch_scrape([('Data Scientist', 'Scotland'),
 #                   ('Data Engineer', 'Scotland'),
 #                   ('Data Analyst', 'Scotland'),
@@ -24,5 +26,6 @@ ind.batch_scrape([('Data Scientist', 'England'),
                   ('Data', 'England')],
                  pages=20,
                  delay=5,
+                 workers=8,
                  f_name='data_england.csv',
                  append=False)
@@ -0,0 +1,193 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    from .metrics import default_metrics
+except ImportError:
+    from metrics import default_metrics
+
+# One pooled session per thread, requests.Session isn't guaranteed to be thread-safe
+_local = threading.local()
+
+
+def get_session(pool_size=10):
+    '''Return this thread's pooled requests.Session, creating it on first use.
+    Connections are kept alive and reused for every request made from the thread'''
+    session = getattr(_local, 'session', None)
+    if session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        _local.session = session
+    return session
+
+
+class CacheMiss(Exception):
+    '''Raised in replay mode when a url has no recorded response'''
+
+
+class Response:
+    '''Minimal response object shared by network and cached responses'''
+
+    def __init__(self, url, status_code, content, from_cache=False):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.from_cache = from_cache
+
+    def __repr__(self):
+        source = 'cache' if self.from_cache else 'network'
+        return f'Response(url="{self.url}", status_code={self.status_code}, from {source})'
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f'{self.status_code} error for url: {self.url}')
+
+
+class ResponseCache:
+    '''On-disk response cache.
+    Each url is stored under the sha256 of the url as a raw body file plus a small
+    json metadata file.  Entries older than `ttl` seconds are treated as missing
+    (ttl=None keeps entries forever)'''
+
+    def __init__(self, path='cache', ttl=None):
+        self.path = path
+        self.ttl = ttl
+
+    def __repr__(self):
+        return f'ResponseCache(path="{self.path}", ttl={self.ttl})'
+
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        folder = os.path.join(self.path, key[:2])
+        return folder, os.path.join(folder, key + '.body'), os.path.join(folder, key + '.json')
+
+    def get(self, url, ignore_ttl=False):
+        '''Return the cached Response for url, or None if missing or expired'''
+        _, body_path, meta_path = self._paths(url)
+        try:
+            with open(meta_path, 'r') as f:
+                meta = json.load(f)
+            with open(body_path, 'rb') as f:
+                content = f.read()
+        except (OSError, ValueError):
+            return None
+
+        if not ignore_ttl and self.ttl is not None and time.time() - meta['fetched'] > self.ttl:
+            return None
+        return Response(url, meta['status_code'], content, from_cache=True)
+
+    def put(self, url, response):
+        folder, body_path, meta_path = self._paths(url)
+        os.makedirs(folder, exist_ok=True)
+        meta = {'url': url, 'status_code': response.status_code, 'fetched': time.time()}
+
+        # Write to temp files and rename, so a crash never leaves a half written entry.
+        # The metadata goes last as its presence marks the entry complete
+        tmp_suffix = f'.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(body_path + tmp_suffix, 'wb') as f:
+            f.write(response.content)
+        os.replace(body_path + tmp_suffix, body_path)
+        with open(meta_path + tmp_suffix, 'w') as f:
+            json.dump(meta, f)
+        os.replace(meta_path + tmp_suffix, meta_path)
+
+    def delete(self, url):
+        '''Remove the entry for url, if there is one'''
+        _, body_path, meta_path = self._paths(url)
+        # Metadata first, without it the entry already counts as missing
+        for path in (meta_path, body_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class Fetcher:
+    '''HTTP layer used by all scraper requests.
+    Requests go through pooled per-thread sessions, an optional ResponseCache and an
+    optional rate limiter (only consulted when the network is actually used).  The limiter
+    is told the outcome of every network request (status, latency or error), which an
+    adaptive one (ratelimit.AdaptivePacer) uses to speed up or back off.
+
+    mode:
+      - "online":  serve fresh cache entries, fetch and store everything else
+      - "refresh": always fetch, overwriting the cache
+      - "replay":  offline, serve recorded responses only (ignoring ttl), raises CacheMiss otherwise
+
+    Request latency, bytes, cache hits and time spent waiting on the limiter are recorded
+    in `metrics` (a metrics.Metrics, shared by default)'''
+
+    modes = ('online', 'refresh', 'replay')
+
+    def __init__(self, cache=None, mode='online', limiter=None, timeout=30, metrics=None):
+        if mode not in self.modes:
+            raise ValueError(f'mode must be one of {self.modes}')
+        if mode == 'replay' and cache is None:
+            raise ValueError('replay mode needs a cache')
+        self.cache = cache
+        self.mode = mode
+        self.limiter = limiter
+        self.timeout = timeout
+        self.metrics = metrics if metrics is not None else default_metrics
+
+    def __repr__(self):
+        return f'Fetcher(cache={self.cache}, mode="{self.mode}", limiter={self.limiter})'
+
+    def get(self, url, headers=None):
+        if self.cache is not None and self.mode != 'refresh':
+            response = self.cache.get(url, ignore_ttl=self.mode == 'replay')
+            if response is not None:
+                self.metrics.inc('cache_hits_total')
+                self.metrics.inc('bytes_fetched_total', len(response.content), source='cache')
+                return response
+            if self.mode == 'replay':
+                self.metrics.inc('cache_misses_total')
+                raise CacheMiss(f'No recorded response for {url}')
+
+        if self.limiter is not None:
+            self.metrics.inc('sleep_seconds_total', self.limiter.acquire(url), reason='rate_limit')
+        start = time.perf_counter()
+        try:
+            page = get_session().get(url, headers=headers, timeout=self.timeout)
+        except requests.RequestException as e:
+            self.metrics.inc('request_errors_total', error=type(e).__name__)
+            self.report(url, error=True)
+            raise
+        finally:
+            latency = time.perf_counter() - start
+            self.metrics.observe('request_seconds', latency)
+        response = Response(url, page.status_code, page.content)
+        self.report(url, status=response.status_code, latency=latency)
+        self.metrics.inc('requests_total', status=response.status_code)
+        self.metrics.inc('bytes_fetched_total', len(response.content), source='network')
+
+        # Only keep successful responses, errors and rate limit pages should be retried
+        if self.cache is not None and response.status_code == 200:
+            self.cache.put(url, response)
+        return response
+
+    def report(self, url, **outcome):
+        '''Pass the outcome of a request on to the limiter, e.g. report(url, blank=True)
+        when a search page came back without any results'''
+        if self.limiter is not None:
+            self.limiter.record(url, **outcome)
+
+    def discard(self, url):
+        '''Drop a cached response which turned out to be unusable (a blank or captcha page
+        served with status 200), so a retry or later run fetches it again.
+        Recorded responses are kept in replay mode'''
+        if self.cache is not None and self.mode != 'replay':
+            self.cache.delete(url)
+            self.metrics.inc('cache_discards_total')
+
+
+# Used when no fetcher is given, no cache or rate limiting
+default_fetcher = Fetcher()
@@ -0,0 +1,162 @@
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds of the histogram buckets, seconds unless given when first observed
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+COUNT_BUCKETS = (0, 1, 5, 10, 15, 20, 30, 50, 100)
+
+
+def _key(name, labels):
+    if not labels:
+        return name
+    return name + '{' + ','.join(f'{k}="{v}"' for k, v in sorted(labels.items())) + '}'
+
+
+class Histogram:
+    '''Count, sum, min/max and per-bucket counts of observed values'''
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def observe(self, value):
+        self.count = self.count + 1
+        self.sum = self.sum + value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.bucket_counts[i] = self.bucket_counts[i] + 1
+                break
+
+    def to_dict(self):
+        return {'count': self.count,
+                'sum': self.sum,
+                'mean': self.sum / self.count if self.count else None,
+                'min': self.min if self.count else None,
+                'max': self.max if self.count else None,
+                'buckets': {str(b): c for b, c in zip(self.buckets, self.bucket_counts)}}
+
+
+class Metrics:
+    '''Thread-safe counters and histograms for one scrape run.
+    Metrics are keyed by name plus optional labels, e.g.
+        metrics.inc('descriptions_total', result='ok')
+        metrics.observe('parse_seconds', 0.02, kind='search')
+    and can be written out as JSON or as a Prometheus textfile'''
+
+    def __init__(self, prefix='indeed_'):
+        self.prefix = prefix
+        self.counters = dict()
+        self.histograms = dict()
+        self.lock = threading.Lock()
+        self.started = time.time()
+
+    def __repr__(self):
+        return f'Metrics({len(self.counters)} counters, {len(self.histograms)} histograms)'
+
+    def inc(self, name, value=1, **labels):
+        key = _key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, buckets=None, **labels):
+        key = _key(name, labels)
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram(buckets or DEFAULT_BUCKETS)
+            self.histograms[key].observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        '''Observe the seconds spent inside the with block'''
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def get(self, name, **labels):
+        '''Current value of a counter (0 if never incremented)'''
+        return self.counters.get(_key(name, labels), 0)
+
+    def snapshot(self):
+        with self.lock:
+            return {'started': self.started,
+                    'elapsed_seconds': time.time() - self.started,
+                    'counters': dict(self.counters),
+                    'histograms': {k: h.to_dict() for k, h in self.histograms.items()}}
+
+    def to_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+    def to_prometheus(self, path):
+        '''Write in the Prometheus text format, e.g. for the node_exporter textfile collector'''
+        lines = []
+        typed = set()
+        with self.lock:
+            for key, value in sorted(self.counters.items()):
+                name, labels = self._split(key)
+                if name not in typed:
+                    lines.append(f'# TYPE {self.prefix}{name} counter')
+                    typed.add(name)
+                lines.append(f'{self.prefix}{key} {value}')
+            for key, hist in sorted(self.histograms.items()):
+                name, labels = self._split(key)
+                if name not in typed:
+                    lines.append(f'# TYPE {self.prefix}{name} histogram')
+                    typed.add(name)
+                cumulative = 0
+                for bound, count in zip(hist.buckets, hist.bucket_counts):
+                    cumulative = cumulative + count
+                    lines.append(f'{self.prefix}{name}_bucket{{{labels}le="{bound}"}} {cumulative}')
+                lines.append(f'{self.prefix}{name}_bucket{{{labels}le="+Inf"}} {hist.count}')
+                suffix = '{' + labels.rstrip(',') + '}' if labels else ''
+                lines.append(f'{self.prefix}{name}_sum{suffix} {hist.sum}')
+                lines.append(f'{self.prefix}{name}_count{suffix} {hist.count}')
+
+        # Write then rename, so a collector never reads a half written file
+        with open(path + '.tmp', 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(path + '.tmp', path)
+
+    @staticmethod
+    def _split(key):
+        # 'name{a="1"}' -> ('name', 'a="1",')
+        if '{' not in key:
+            return key, ''
+        name, labels = key.split('{', 1)
+        return name, labels[:-1] + ','
+
+    def export(self, path):
+        '''Write to path, as a Prometheus textfile if it ends in .prom, otherwise JSON'''
+        if path.endswith('.prom'):
+            self.to_prometheus(path)
+        else:
+            self.to_json(path)
+
+    def summary(self):
+        '''A few lines on where the time went, for the end of a run'''
+        snap = self.snapshot()
+        hists = snap['histograms']
+        lines = [f'Run took {snap["elapsed_seconds"]:.1f}s']
+        for key, hist in sorted(hists.items()):
+            if hist['count']:
+                lines.append(f'  {key}: n={hist["count"]} total={hist["sum"]:.2f} mean={hist["mean"]:.3f}')
+        for key, value in sorted(snap['counters'].items()):
+            value = f'{value:.2f}' if isinstance(value, float) else value
+            lines.append(f'  {key}: {value}')
+        return '\n'.join(lines)
+
+
+# Used by fetchers which aren't given their own Metrics
+default_metrics = Metrics()
@@ -0,0 +1,244 @@
+'''Near-duplicate detection for job descriptions (re-posts, the same job from several agencies).
+
+Each description is reduced to a MinHash signature of its word shingles, and signatures are
+bucketed by band in an LSH index, so only ads sharing a band are ever compared.  Candidate
+pairs whose estimated Jaccard similarity reaches `threshold` are joined with union-find, and
+each ad gets a cluster id: the id of the first ad seen in its cluster.
+
+The index is saved to a single .npz file and can be added to as new batches are scraped
+    index = NearDuplicateIndex.load('data/near_duplicates.npz')
+    df = add_cluster_ids(df, index)
+    index.save('data/near_duplicates.npz')
+
+or from the command line
+    python indeed/near_duplicates.py data/data.csv data/data_clustered.csv --index data/near_duplicates.npz
+'''
+import argparse
+import os
+import re
+import zlib
+
+import numpy as np
+import pandas as pd
+
+# Modulus of the MinHash permutations, a prime just above 2**32.
+# With a, b and x below 2**32, a*x + b can't overflow uint64
+PRIME = np.uint64(4294967311)
+MASK32 = np.uint64(0xFFFFFFFF)
+# Multiplier used to combine the word hashes of a shingle
+SHINGLE_MULT = np.uint64(1099511628211)
+WORD_RE = re.compile(r'\w+')
+
+
+class NearDuplicateIndex:
+    '''MinHash LSH index of descriptions, with a union-find of the duplicate clusters.
+    num_perm hash functions are split into `bands` bands of num_perm/bands rows.  With the
+    defaults (128 = 16 x 8) ads above ~0.7 Jaccard similarity usually share a band, and
+    candidates are then only joined if their signatures agree on at least `threshold`'''
+
+    def __init__(self, num_perm=128, bands=16, shingle_size=5, threshold=0.8, seed=1):
+        if num_perm % bands != 0:
+            raise ValueError('num_perm must be a multiple of bands')
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.threshold = threshold
+        self.seed = seed
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, 2**32, size=num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, 2**32, size=num_perm, dtype=np.uint64)
+
+        self.ids = []
+        self.positions = dict()  # job id -> position in self.ids
+        self.parent = []
+        self.signatures = np.zeros((0, num_perm), dtype=np.uint32)
+        self.buckets = [dict() for _ in range(bands)]
+        self.word_hashes = dict()
+
+    def __repr__(self):
+        return (f'NearDuplicateIndex({len(self)} ads, {self.n_clusters()} clusters, '
+                f'num_perm={self.num_perm}, bands={self.bands}, threshold={self.threshold})')
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, job_id):
+        return job_id in self.positions
+
+    def shingles(self, text):
+        '''32 bit hashes of the text's word shingles (the whole text if it's shorter than one)'''
+        words = WORD_RE.findall(str(text).lower())
+        if len(words) == 0:
+            return np.zeros(0, dtype=np.uint64)
+        hashes = []
+        for word in words:
+            h = self.word_hashes.get(word)
+            if h is None:
+                h = zlib.crc32(word.encode('utf-8'))
+                self.word_hashes[word] = h
+            hashes.append(h)
+        hashes = np.array(hashes, dtype=np.uint64)
+
+        # Polynomial hash of each run of shingle_size words (wrapping around 2**64)
+        k = min(self.shingle_size, len(hashes))
+        n = len(hashes) - k + 1
+        combined = hashes[:n].copy()
+        for j in range(1, k):
+            combined = combined * SHINGLE_MULT + hashes[j:j+n]
+        return np.unique((combined ^ (combined >> np.uint64(32))) & MASK32)
+
+    def signature(self, text):
+        '''MinHash signature (num_perm uint32), all 0xFFFFFFFF for a text without words'''
+        shingles = self.shingles(text)
+        if len(shingles) == 0:
+            return np.full(self.num_perm, 0xFFFFFFFF, dtype=np.uint32)
+        values = (self.a[:, None] * shingles[None, :] + self.b[:, None]) % PRIME
+        return (values.min(axis=1) & MASK32).astype(np.uint32)
+
+    def similarity(self, text1, text2):
+        '''Estimated Jaccard similarity of two texts'''
+        return float(np.mean(self.signature(text1) == self.signature(text2)))
+
+    def find(self, position):
+        root = position
+        while self.parent[root] != root:
+            root = self.parent[root]
+        # Path compression
+        while self.parent[position] != root:
+            self.parent[position], position = root, self.parent[position]
+        return root
+
+    def union(self, p1, p2):
+        r1, r2 = self.find(p1), self.find(p2)
+        # The earliest ad stays the root, so cluster ids don't change as ads are added
+        if r1 < r2:
+            self.parent[r2] = r1
+        elif r2 < r1:
+            self.parent[r1] = r2
+
+    def _grow(self, n):
+        # Signature rows are allocated with spare capacity, like a list
+        needed = len(self.ids) + n
+        if needed > len(self.signatures):
+            capacity = max(needed, 2 * len(self.signatures), 1024)
+            signatures = np.zeros((capacity, self.num_perm), dtype=np.uint32)
+            signatures[:len(self.ids)] = self.signatures[:len(self.ids)]
+            self.signatures = signatures
+
+    def _insert(self, job_id, signature, link=True):
+        position = len(self.ids)
+        self.ids.append(job_id)
+        self.positions[job_id] = position
+        self.parent.append(position)
+        self.signatures[position] = signature
+        if (signature == 0xFFFFFFFF).all():
+            return position  # no words, never a duplicate
+
+        candidates = set()
+        for band in range(self.bands):
+            key = signature[band*self.rows:(band+1)*self.rows].tobytes()
+            bucket = self.buckets[band].setdefault(key, [])
+            candidates.update(bucket)
+            bucket.append(position)
+
+        if link and candidates:
+            candidates = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+            agreement = (self.signatures[candidates] == signature).mean(axis=1)
+            for other in candidates[agreement >= self.threshold]:
+                self.union(position, int(other))
+        return position
+
+    def add(self, ids, texts):
+        '''Add ads to the index, returns the cluster id of each.
+        Ids already in the index keep their place (their text isn't re-read)'''
+        ids = list(ids)
+        self._grow(len(ids))
+        for job_id, text in zip(ids, texts):
+            if job_id not in self.positions:
+                self._insert(job_id, self.signature(text))
+        return self.cluster_ids(ids)
+
+    def cluster_ids(self, ids):
+        '''Cluster id of each of ids (None for ids not in the index)'''
+        clusters = []
+        for job_id in ids:
+            position = self.positions.get(job_id)
+            clusters.append(None if position is None else self.ids[self.find(position)])
+        return clusters
+
+    def n_clusters(self):
+        return sum(self.find(i) == i for i in range(len(self.ids)))
+
+    def save(self, path):
+        folder = os.path.dirname(path)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder)
+        parent = np.array([self.find(i) for i in range(len(self.ids))], dtype=np.int64)
+        # Write then rename, a crash never leaves a half written index
+        with open(path + '.tmp', 'wb') as f:
+            np.savez(f, ids=np.array(self.ids, dtype=object), parent=parent,
+                     signatures=self.signatures[:len(self.ids)],
+                     params=np.array([self.num_perm, self.bands, self.shingle_size, self.seed]),
+                     threshold=np.array(self.threshold))
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        '''Load a saved index, or create a new one (with kwargs) if path doesn't exist yet'''
+        if not os.path.isfile(path):
+            return cls(**kwargs)
+        with np.load(path, allow_pickle=True) as data:
+            num_perm, bands, shingle_size, seed = [int(x) for x in data['params']]
+            index = cls(num_perm=num_perm, bands=bands, shingle_size=shingle_size,
+                        threshold=float(data['threshold']), seed=seed)
+            signatures = data['signatures']
+            parent = data['parent'].tolist()
+            ids = data['ids'].tolist()
+
+        # Rebuild the buckets from the signatures, clusters are restored from the saved roots
+        index._grow(len(ids))
+        for job_id, signature in zip(ids, signatures):
+            index._insert(job_id, signature, link=False)
+        index.parent = parent
+        return index
+
+
+def add_cluster_ids(df, index=None, column='description', id_column='id', verbose=True):
+    '''Add a cluster_id column to df, marking near-duplicate descriptions.
+    Rows are added to index (a new NearDuplicateIndex if None), so a persisted index clusters
+    new batches together with everything seen before.  Collapse duplicates downstream with
+    df.drop_duplicates('cluster_id')'''
+    if index is None:
+        index = NearDuplicateIndex()
+    df = df.copy()
+    df['cluster_id'] = index.add(df[id_column].tolist(), df[column].fillna('').tolist())
+
+    if verbose:
+        n_clusters = df['cluster_id'].nunique()
+        print(f'{len(df)} rows in {n_clusters} clusters ({len(df)-n_clusters} near-duplicates)')
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Add near-duplicate cluster ids to scraped jobs')
+    parser.add_argument('input', help='.csv of scraped jobs')
+    parser.add_argument('output', help='.csv to write, with a cluster_id column')
+    parser.add_argument('--index', default=None, help='.npz index to load and update, so batches are clustered together')
+    parser.add_argument('--threshold', type=float, default=0.8, help='Jaccard similarity for a near-duplicate (new index only)')
+    args = parser.parse_args()
+
+    if args.index is not None:
+        index = NearDuplicateIndex.load(args.index, threshold=args.threshold)
+    else:
+        index = NearDuplicateIndex(threshold=args.threshold)
+    df = pd.read_csv(args.input, index_col=0)
+    df = add_cluster_ids(df, index)
+    df.to_csv(args.output)
+    if args.index is not None:
+        index.save(args.index)
+        print(index)
+
+
+if __name__ == '__main__':
+    main()
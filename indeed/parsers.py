@@ -0,0 +1,220 @@
+import re
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml.html
+    from lxml import etree
+except ImportError:
+    lxml = None
+
+# The two search page layouts served by Indeed, keyed by the page_format column value.
+# Each field is (column, css class, tag or None, required)
+CARD_FORMATS = {
+    0: {'card_class': 'jobsearch-SerpJobCard',
+        'href': 'title',  # link is on the title element
+        'fields': [('title', 'jobtitle', None, True),
+                   ('company', 'company', 'span', True),
+                   ('location', 'location', None, True),
+                   ('salary', 'salary-snippet', None, False),
+                   ('summary', 'summary', None, True),
+                   ('date', 'date', None, True)]},
+    1: {'card_class': 'tapItem',
+        'href': 'card',  # the card itself is the link
+        'fields': [('title', 'jobTitle', None, True),
+                   ('company', 'companyName', None, True),
+                   ('location', 'companyLocation', None, True),
+                   ('salary', 'salary-snippet', None, False),
+                   ('summary', 'job-snippet', None, True),
+                   ('date', 'date', None, True)]},
+}
+CARD_CLASSES = [CARD_FORMATS[f]['card_class'] for f in CARD_FORMATS]
+DESCRIPTION_ID = 'jobDescriptionText'
+
+
+def _is_card_class(value):
+    # Depending on the bs4 version the strainer sees either the raw class string,
+    # a list of classes or one class at a time, so split whatever arrives
+    if value is None:
+        return False
+    classes = value.split() if isinstance(value, str) else value
+    return any(c in CARD_CLASSES for c in classes)
+
+
+class SoupEngine:
+    '''BeautifulSoup based engine.
+    With strain=True only the job cards / description element are built into a tree
+    (using a SoupStrainer), rather than the whole page'''
+
+    def __init__(self, builder='html.parser', strain=False):
+        self.builder = builder
+        self.strain = strain
+
+    def __repr__(self):
+        return f'SoupEngine(builder="{self.builder}", strain={self.strain})'
+
+    def search_cards(self, content):
+        '''Return {page_format: [card nodes]} for every card layout on the page'''
+        parse_only = SoupStrainer(attrs={'class': _is_card_class}) if self.strain else None
+        soup = BeautifulSoup(content, self.builder, parse_only=parse_only)
+        return {f: soup.find_all(class_=CARD_FORMATS[f]['card_class']) for f in CARD_FORMATS}
+
+    def find(self, node, css_class, tag=None):
+        return node.find(tag, class_=css_class)
+
+    def text(self, node):
+        return node.text
+
+    def attr(self, node, name):
+        return node[name]
+
+    def description(self, content):
+        '''Return (text, html) of the job description element, or None if missing'''
+        parse_only = SoupStrainer(id=DESCRIPTION_ID) if self.strain else None
+        soup = BeautifulSoup(content, self.builder, parse_only=parse_only)
+        node = soup.find(id=DESCRIPTION_ID)
+        if node is None:
+            return None
+        return node.text, str(node)
+
+
+class LxmlEngine:
+    '''lxml engine using precompiled XPath queries, much faster than BeautifulSoup.
+    The description_html it returns is serialised by lxml, so may differ cosmetically
+    (attribute quoting, entities) from the BeautifulSoup engines'''
+
+    def __init__(self):
+        if lxml is None:
+            raise ImportError('The lxml parser engine needs the lxml package installed')
+        self.cards_xpath = etree.XPath(' | '.join(f'//*[{self._has_class(c)}]' for c in CARD_CLASSES))
+        self.description_xpath = etree.XPath(f'//*[@id="{DESCRIPTION_ID}"]')
+        self.field_xpaths = dict()
+
+    def __repr__(self):
+        return 'LxmlEngine()'
+
+    @staticmethod
+    def _has_class(css_class):
+        return f'contains(concat(" ", normalize-space(@class), " "), " {css_class} ")'
+
+    def _parse(self, content):
+        try:
+            return lxml.html.fromstring(content)
+        except (etree.ParserError, ValueError):
+            # Empty or unparseable page, treat as blank
+            return None
+
+    def search_cards(self, content):
+        '''Return {page_format: [card nodes]} for every card layout on the page, in one pass'''
+        found = {f: [] for f in CARD_FORMATS}
+        doc = self._parse(content)
+        if doc is None:
+            return found
+        for node in self.cards_xpath(doc):
+            classes = (node.get('class') or '').split()
+            for f in CARD_FORMATS:
+                if CARD_FORMATS[f]['card_class'] in classes:
+                    found[f].append(node)
+        return found
+
+    def find(self, node, css_class, tag=None):
+        key = (css_class, tag)
+        if key not in self.field_xpaths:
+            self.field_xpaths[key] = etree.XPath(f'(.//{tag or "*"}[{self._has_class(css_class)}])[1]')
+        result = self.field_xpaths[key](node)
+        return result[0] if result else None
+
+    def text(self, node):
+        return node.text_content()
+
+    def attr(self, node, name):
+        return node.attrib[name]
+
+    def description(self, content):
+        doc = self._parse(content)
+        if doc is None:
+            return None
+        result = self.description_xpath(doc)
+        if not result:
+            return None
+        node = result[0]
+        return node.text_content(), etree.tostring(node, encoding='unicode', method='html', with_tail=False)
+
+
+def _strainer_engine():
+    # lxml is a faster tree builder than html.parser when it's available
+    return SoupEngine(builder='lxml' if lxml is not None else 'html.parser', strain=True)
+
+ENGINES = {
+    'html.parser': lambda: SoupEngine('html.parser', strain=False),  # original full page parse
+    'strainer': _strainer_engine,
+    'lxml': LxmlEngine,
+}
+# Pure lxml when installed, it gives the same text fields several times faster
+DEFAULT_ENGINE = 'lxml' if lxml is not None else 'strainer'
+_engines = dict()
+
+
+def get_engine(engine=None):
+    '''Return a parser engine instance by name (None for DEFAULT_ENGINE), or pass an instance through'''
+    if engine is None:
+        engine = DEFAULT_ENGINE
+    if not isinstance(engine, str):
+        return engine
+    if engine not in ENGINES:
+        raise ValueError(f'Unknown parser engine "{engine}", choose from {list(ENGINES)}')
+    if engine not in _engines:
+        _engines[engine] = ENGINES[engine]()
+    return _engines[engine]
+
+
+def parse_search_page(content, base_url, engine=None):
+    '''Extract every job card from a search results page as a list of dicts.
+    Both page layouts are located in one pass, the classic jobsearch-SerpJobCard
+    layout wins if the page has any of those cards'''
+    engine = get_engine(engine)
+    found = engine.search_cards(content)
+    page_format = 0 if len(found[0]) > 0 else 1
+    spec = CARD_FORMATS[page_format]
+
+    cards = []
+    for node in found[page_format]:
+        card = dict()
+        for column, css_class, tag, required in spec['fields']:
+            field = engine.find(node, css_class, tag)
+            if field is None:
+                if required:
+                    raise ValueError(f'Job card is missing its {column} ({css_class})')
+                card[column] = ''
+            else:
+                card[column] = engine.text(field).strip()
+            if column == 'title':
+                href_node = field if spec['href'] == 'title' else node
+
+        card_id = engine.attr(node, 'id')
+        # card_id = re.sub(r'job_|sj_|p_|pj_','',card_id)
+        card_id = re.sub(r'.*_','',card_id)
+
+        cards.append({
+            'title': card['title'],
+            'id': card_id,
+            'company': card['company'],
+            'url': base_url + engine.attr(href_node, 'href'),
+            'salary': card['salary'],
+            'location': card['location'],
+            'summary': card['summary'],
+            'date': card['date'],
+            'page_format': page_format
+        })
+    return cards
+
+
+def parse_description(content, engine=None):
+    '''Extract the job description, returns a dict with description and description_html
+    or None if the page has no description'''
+    result = get_engine(engine).description(content)
+    if result is None:
+        return None
+    text, html = result
+    return {'description': text.strip(),
+            'description_html': html}
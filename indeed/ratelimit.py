@@ -0,0 +1,164 @@
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+
+class TokenBucket:
+    '''Thread-safe token bucket.
+    Tokens refill continuously at `rate` per second up to `capacity`, each request
+    takes one token and blocks until one is available.'''
+
+    def __init__(self, rate, capacity=1):
+        if rate <= 0:
+            raise ValueError('rate must be greater than 0')
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return f'TokenBucket(rate={self.rate}, capacity={self.capacity})'
+
+    def acquire(self):
+        '''Take one token, sleeping until one is available.
+        Returns the number of seconds spent waiting'''
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+class HostRateLimiter:
+    '''Keeps one TokenBucket per host so the requests-per-second ceiling applies
+    to each server separately.  A rate of None disables limiting'''
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.buckets = dict()
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return f'HostRateLimiter(rate={self.rate}, capacity={self.capacity})'
+
+    def get_bucket(self, url):
+        host = urlparse(url).netloc
+        with self.lock:
+            if host not in self.buckets:
+                self.buckets[host] = TokenBucket(self.rate, self.capacity)
+            return self.buckets[host]
+
+    def acquire(self, url):
+        '''Block until a request to this url's host is allowed.
+        Returns the number of seconds spent waiting'''
+        if self.rate is None:
+            return 0.0
+        return self.get_bucket(url).acquire()
+
+    def record(self, url, status=None, latency=None, error=False, blank=False):
+        '''Fixed rate, outcomes are ignored'''
+        pass
+
+
+class _HostPace:
+    '''Pacing state of one host'''
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.next_allowed = 0.0
+        self.failures = 0
+
+
+class AdaptivePacer:
+    '''Per-host request pacing which adapts to how the server is coping.
+    Requests to a host are spaced `interval` seconds apart, starting from min_interval.
+    After each response (see record):
+      - success: the interval shrinks by `speedup`, back down to min_interval
+      - slow success (latency over slow_latency seconds): the interval grows by `slowdown`
+      - failure (HTTP 429 or 5xx, a request error, or a blank results or description page): the interval
+        doubles, and the next request is held off by an exponential backoff with jitter,
+        base_backoff * 2**(failures in a row - 1), capped at max_interval
+    So a healthy run goes as fast as min_interval allows, and only failures add sleeps.
+    Same acquire(url) interface as HostRateLimiter'''
+
+    def __init__(self, min_interval=1.0, max_interval=60.0, slow_latency=5.0, speedup=0.9, slowdown=1.5,
+                 base_backoff=None, random_state=None):
+        if min_interval < 0 or max_interval < min_interval:
+            raise ValueError('need 0 <= min_interval <= max_interval')
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.slow_latency = slow_latency
+        self.speedup = speedup
+        self.slowdown = slowdown
+        self.base_backoff = base_backoff if base_backoff is not None else max(min_interval, 1.0)
+        self.random = random.Random(random_state)
+        self.paces = dict()
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return f'AdaptivePacer(min_interval={self.min_interval}, max_interval={self.max_interval})'
+
+    def get_pace(self, url):
+        host = urlparse(url).netloc
+        with self.lock:
+            if host not in self.paces:
+                self.paces[host] = _HostPace(self.min_interval)
+            return self.paces[host]
+
+    def interval(self, url):
+        '''Current interval between requests to this url's host'''
+        return self.get_pace(url).interval
+
+    def acquire(self, url):
+        '''Block until this url's host is due its next request.
+        Each caller reserves the next slot, so concurrent threads are spaced out too.
+        Returns the number of seconds spent waiting'''
+        pace = self.get_pace(url)
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, pace.next_allowed)
+            pace.next_allowed = start + pace.interval
+        wait = start - now
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def record(self, url, status=None, latency=None, error=False, blank=False):
+        '''Adjust the host's pacing from the outcome of a request'''
+        pace = self.get_pace(url)
+        failed = error or blank or status == 429 or (status is not None and status >= 500)
+        with self.lock:
+            if failed:
+                pace.failures = pace.failures + 1
+                pace.interval = min(self.max_interval, max(pace.interval, self.base_backoff) * 2)
+                # Equal jitter: at least half the backoff, so it still grows with each failure
+                backoff = min(self.max_interval, self.base_backoff * 2 ** (pace.failures - 1))
+                backoff = backoff / 2 + self.random.uniform(0, backoff / 2)
+                pace.next_allowed = max(pace.next_allowed, time.monotonic() + backoff)
+            elif latency is not None and latency > self.slow_latency:
+                pace.failures = 0
+                pace.interval = min(self.max_interval, max(pace.interval, self.base_backoff) * self.slowdown)
+            else:
+                pace.failures = 0
+                pace.interval = max(self.min_interval, pace.interval * self.speedup)
+
+
+def make_limiter(rate, adaptive=True, max_interval=60.0):
+    '''Limiter for a ceiling of `rate` requests per second per host (None for no ceiling).
+    adaptive=True paces with AdaptivePacer (slowing down within max_interval when the
+    server struggles), otherwise a fixed HostRateLimiter.
+    A rate slower than one request per max_interval raises the cap to match, rather than failing'''
+    if adaptive:
+        min_interval = 1 / rate if rate else 0.0
+        return AdaptivePacer(min_interval=min_interval, max_interval=max(max_interval, min_interval))
+    return HostRateLimiter(rate)
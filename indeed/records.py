@@ -0,0 +1,80 @@
+import pandas as pd
+
+
+class RecordBuffer:
+    '''Append-only column store for scraped rows.
+    Each column is a plain list, so adding a row is O(1) instead of copying a whole
+    DataFrame.  The DataFrame is only built when asked for, and is cached until the
+    buffer next changes.  Rows are addressed by position (the frame's RangeIndex)'''
+
+    def __init__(self, columns=()):
+        self.columns = []
+        self.data = dict()
+        self.length = 0
+        self._frame = None
+        for column in columns:
+            self.add_column(column)
+
+    def __len__(self):
+        return self.length
+
+    def __repr__(self):
+        return f'RecordBuffer({self.length} rows, {len(self.columns)} columns)'
+
+    def add_column(self, column):
+        if column not in self.data:
+            self.columns.append(column)
+            self.data[column] = [None] * self.length
+
+    def append(self, record):
+        '''Add one row from a dict, unseen keys become new columns'''
+        for column in record:
+            if column not in self.data:
+                self.add_column(column)
+        for column in self.columns:
+            self.data[column].append(record.get(column))
+        self.length = self.length + 1
+        self._frame = None
+
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+
+    def get(self, i, column):
+        return self.data[column][i]
+
+    def set(self, i, column, value):
+        self.add_column(column)
+        self.data[column][i] = value
+        self._frame = None
+
+    def column(self, column):
+        '''The underlying list for a column, treat it as read-only'''
+        return self.data[column]
+
+    def to_frame(self):
+        if self._frame is None:
+            if self.length == 0:
+                # Keep object columns for an empty frame, rather than inferring float
+                self._frame = pd.DataFrame(columns=self.columns)
+            else:
+                self._frame = pd.DataFrame(self.data, columns=self.columns)
+        return self._frame
+
+    def take(self, positions):
+        '''New buffer holding only the rows at the given positions, in that order'''
+        buffer = RecordBuffer(self.columns)
+        for column in self.columns:
+            values = self.data[column]
+            buffer.data[column] = [values[i] for i in positions]
+        buffer.length = len(positions)
+        return buffer
+
+    @classmethod
+    def from_frame(cls, df):
+        '''Build a buffer from an existing DataFrame (the index is not kept)'''
+        buffer = cls(df.columns)
+        for column in buffer.columns:
+            buffer.data[column] = df[column].tolist()
+        buffer.length = len(df)
+        return buffer
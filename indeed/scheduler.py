@@ -0,0 +1,52 @@
+import logging
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class WorkQueue:
+    '''Runs tasks on a fixed pool of worker threads.
+    Tasks are plain callables and may submit further tasks while they run, run() returns
+    once the queue is empty and no task is still in progress'''
+
+    def __init__(self, workers=4):
+        self.workers = workers
+        self.queue = queue.Queue()
+        self.errors = []
+
+    def __repr__(self):
+        return f'WorkQueue(workers={self.workers})'
+
+    def submit(self, fn, *args, **kwargs):
+        self.queue.put((fn, args, kwargs))
+
+    def _worker(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                return
+            fn, args, kwargs = item
+            try:
+                fn(*args, **kwargs)
+            except Exception as e:
+                logger.exception(f'Task {getattr(fn, "__name__", fn)} failed')
+                self.errors.append(e)
+            finally:
+                self.queue.task_done()
+
+    def run(self):
+        '''Process tasks until the queue drains.  Returns the list of task exceptions'''
+        threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+
+        # A task only calls task_done() after any tasks it submitted are queued,
+        # so join() can't return while there is still follow-on work
+        self.queue.join()
+        for _ in threads:
+            self.queue.put(None)
+        for thread in threads:
+            thread.join()
+        return self.errors
@@ -0,0 +1,59 @@
+import os
+import sqlite3
+import threading
+import time
+
+
+class SeenIndex:
+    '''Persistent record of job ids which have already been saved with a description.
+    Stored in a small SQLite file so it survives between batch runs, letting later
+    runs skip description requests for ads they have already got'''
+
+    # SQLite limits the number of parameters in one statement
+    chunk_size = 500
+
+    def __init__(self, path=os.path.join('data', 'seen_jobs.sqlite')):
+        folder = os.path.dirname(path)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder)
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute('CREATE TABLE IF NOT EXISTS seen ('
+                              'id TEXT PRIMARY KEY, query_title TEXT, first_seen REAL)')
+
+    def __repr__(self):
+        return f'SeenIndex(path="{self.path}", {len(self)} jobs)'
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute('SELECT COUNT(*) FROM seen').fetchone()[0]
+
+    def __contains__(self, job_id):
+        with self.lock:
+            row = self.conn.execute('SELECT 1 FROM seen WHERE id = ?', (job_id,)).fetchone()
+        return row is not None
+
+    def seen(self, job_ids):
+        '''Return the subset of job_ids which are already in the index'''
+        job_ids = list(set(job_ids))
+        found = set()
+        with self.lock:
+            for start in range(0, len(job_ids), self.chunk_size):
+                chunk = job_ids[start:start+self.chunk_size]
+                marks = ','.join('?' * len(chunk))
+                rows = self.conn.execute(f'SELECT id FROM seen WHERE id IN ({marks})', chunk)
+                found.update(row[0] for row in rows)
+        return found
+
+    def add(self, job_ids, query_title=None):
+        '''Record job ids as saved with a description (ids already present are left alone)'''
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.executemany('INSERT OR IGNORE INTO seen (id, query_title, first_seen) VALUES (?, ?, ?)',
+                                  [(job_id, query_title, now) for job_id in job_ids])
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,106 @@
+import datetime
+import os
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# Layout under a storage root:
+#   jobs/query_title=.../scrape_date=.../*.parquet   everything except the raw html
+#   html/query_title=.../scrape_date=.../*.parquet   id + description_html, zstd compressed
+JOBS_DIR = 'jobs'
+HTML_DIR = 'html'
+HTML_COLUMN = 'description_html'
+PARTITION_COLS = ['query_title', 'scrape_date']
+# Low-cardinality text columns, stored dictionary encoded and read back as categoricals
+DICTIONARY_COLS = ['company', 'location', 'query_loc']
+
+
+def _check_pyarrow():
+    if pa is None:
+        raise ImportError('Parquet storage needs the pyarrow package installed')
+
+
+def save_parquet(df, root, scrape_date=None, overwrite=False):
+    '''Write scraped jobs to a Parquet dataset under root, partitioned by query and scrape date.
+    description_html goes to a separate, zstd compressed dataset so it's only read when asked for.
+    With overwrite=True the partitions being written replace any existing data for them,
+    otherwise new files are added alongside'''
+    _check_pyarrow()
+    if scrape_date is None:
+        scrape_date = datetime.date.today().isoformat()
+    df = df.reset_index(drop=True).assign(scrape_date=scrape_date)
+    for col in DICTIONARY_COLS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+
+    behaviour = 'delete_matching' if overwrite else 'overwrite_or_ignore'
+    main_cols = [c for c in df.columns if c != HTML_COLUMN]
+    pq.write_to_dataset(pa.Table.from_pandas(df[main_cols], preserve_index=False),
+                        root_path=os.path.join(root, JOBS_DIR),
+                        partition_cols=PARTITION_COLS,
+                        existing_data_behavior=behaviour,
+                        compression='snappy')
+
+    if HTML_COLUMN in df.columns:
+        pq.write_to_dataset(pa.Table.from_pandas(df[['id', HTML_COLUMN] + PARTITION_COLS], preserve_index=False),
+                            root_path=os.path.join(root, HTML_DIR),
+                            partition_cols=PARTITION_COLS,
+                            existing_data_behavior=behaviour,
+                            compression='zstd')
+
+
+def _dataset(root, folder):
+    return ds.dataset(os.path.join(root, folder), format='parquet', partitioning='hive')
+
+
+def load_jobs(root, columns=None, query_title=None, scrape_date=None, with_html=False):
+    '''Read scraped jobs from a Parquet dataset.
+    Only the requested columns are read from disk, e.g. columns=['id', 'title', 'description'],
+    and query_title / scrape_date (a value or list of values) prune whole partitions.
+    description_html is only read (and joined on id) with with_html=True'''
+    _check_pyarrow()
+    filters = _partition_filter(query_title, scrape_date)
+    df = _dataset(root, JOBS_DIR).to_table(columns=columns, filter=filters).to_pandas()
+
+    if with_html:
+        html = load_html(root, query_title=query_title, scrape_date=scrape_date)
+        df = df.merge(html.drop_duplicates('id'), on='id', how='left')
+    return df
+
+
+def load_html(root, ids=None, query_title=None, scrape_date=None):
+    '''Read description_html for the given job ids (or all of them)'''
+    _check_pyarrow()
+    filters = _partition_filter(query_title, scrape_date)
+    if ids is not None:
+        id_filter = ds.field('id').isin(list(ids))
+        filters = id_filter if filters is None else filters & id_filter
+    table = _dataset(root, HTML_DIR).to_table(columns=['id', HTML_COLUMN], filter=filters)
+    return table.to_pandas()
+
+
+def _partition_filter(query_title=None, scrape_date=None):
+    filters = None
+    for col, value in zip(PARTITION_COLS, [query_title, scrape_date]):
+        if value is None:
+            continue
+        values = [value] if isinstance(value, str) else list(value)
+        condition = ds.field(col).isin(values)
+        filters = condition if filters is None else filters & condition
+    return filters
+
+
+def csv_to_parquet(f_name, root, scrape_date=None, chunksize=10000):
+    '''Convert an existing scraped .csv (as written by SearchPageScraper.save) into the
+    Parquet layout, reading it in chunks.  Rows without a query_title go under "unknown"'''
+    for chunk in pd.read_csv(f_name, index_col=0, chunksize=chunksize):
+        if 'query_title' not in chunk.columns:
+            chunk['query_title'] = 'unknown'
+        chunk['query_title'] = chunk['query_title'].fillna('unknown')
+        save_parquet(chunk, root, scrape_date=scrape_date)
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The app and scraper modules import each other by name, as when run as scripts
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for folder in ('app', 'indeed'):
+    sys.path.insert(0, os.path.join(ROOT, folder))
@@ -0,0 +1,88 @@
+'''CompactPredictor must give the same probabilities as the pipeline it was exported from'''
+import random
+
+import numpy as np
+import pytest
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.naive_bayes import MultinomialNB
+
+imblearn = pytest.importorskip('imblearn')
+from imblearn.over_sampling import SMOTE
+from imblearn.pipeline import Pipeline
+
+import clf_funcs
+from clf_funcs import TextPreprocessor, dummy
+from model_artifact import CompactPredictor, export_artifact, load_model
+
+
+WORDS = ['python', 'sql', 'spark', 'aws', 'model', 'statistic', 'dashboard', 'excel', 'pipeline', 'etl',
+         'report', 'stakeholder', 'experiment', 'cloud', 'kafka', 'tableau', 'café', 'naïve']
+CLASSES = ['data analyst', 'data engineer', 'data scientist']
+
+
+def make_docs(n, seed):
+    random.seed(seed)
+    docs, labels = [], []
+    for _ in range(n):
+        label = random.choice(CLASSES)
+        # Each class leans on its own part of the vocabulary, so the model has something to learn
+        bias = WORDS[CLASSES.index(label) * 5:CLASSES.index(label) * 5 + 5]
+        words = [random.choice(bias if random.random() < 0.5 else WORDS) for _ in range(random.randint(0, 30))]
+        docs.append(' '.join(words))
+        labels.append(label)
+    return docs, labels
+
+
+@pytest.fixture(autouse=True)
+def simple_tokenizer(monkeypatch):
+    # Split on spaces plus bigrams, so the test doesn't need the NLTK data
+    def tokenize_doc(doc):
+        words = doc.split()
+        return words + [a + ' ' + b for a, b in zip(words, words[1:])]
+    monkeypatch.setattr(clf_funcs, 'tokenize_doc', tokenize_doc)
+
+
+@pytest.mark.parametrize('tfidf_params', [dict(min_df=0.1, max_df=0.9),
+                                          dict(sublinear_tf=True),
+                                          dict(norm='l1', use_idf=False),
+                                          dict(norm=None)])
+def test_predictions_match_pipeline(tmp_path, tfidf_params):
+    # Same steps as clf.pkl
+    clf = Pipeline([('preprocess', TextPreprocessor()),
+                    ('tfidf', TfidfVectorizer(tokenizer=dummy, preprocessor=dummy, token_pattern=None,
+                                              lowercase=False, **tfidf_params)),
+                    ('smote', SMOTE(sampling_strategy='minority', random_state=42)),
+                    ('clf', MultinomialNB())])
+    clf.fit(*make_docs(300, seed=0))
+
+    export_artifact(clf, str(tmp_path))
+    predictor = load_model(str(tmp_path))
+    assert isinstance(predictor, CompactPredictor)
+
+    # Unseen docs, including an empty one and words outside the vocabulary
+    docs, _ = make_docs(200, seed=1)
+    docs = docs + ['', 'unknown words only', 'python python python']
+    assert predictor.classes_.tolist() == clf.classes_.tolist()
+    np.testing.assert_allclose(predictor.predict_proba(docs), clf.predict_proba(docs), rtol=1e-9, atol=1e-12)
+    assert predictor.predict(docs).tolist() == clf.predict(docs).tolist()
+
+    # Same TF-IDF matrix, with columns in sorted vocabulary order
+    terms = sorted(clf['tfidf'].vocabulary_, key=lambda t: t.encode('utf-8'))
+    columns = [clf['tfidf'].vocabulary_[t] for t in terms]
+    expected = clf['tfidf'].transform(clf['preprocess'].transform(docs))[:, columns]
+    np.testing.assert_allclose(predictor.transform(docs).toarray(), expected.toarray(), rtol=1e-9, atol=1e-12)
+
+
+def test_lookup(tmp_path):
+    clf = Pipeline([('preprocess', TextPreprocessor()),
+                    ('tfidf', TfidfVectorizer(tokenizer=dummy, preprocessor=dummy, token_pattern=None, lowercase=False)),
+                    ('clf', MultinomialNB())])
+    clf.fit(*make_docs(100, seed=0))
+    export_artifact(clf, str(tmp_path))
+    predictor = CompactPredictor(str(tmp_path))
+
+    terms = ['café', 'zzz', 'aws', '', 'python sql']
+    vocab = sorted(clf['tfidf'].vocabulary_, key=lambda t: t.encode('utf-8'))
+    expected = [vocab.index(t) if t in vocab else -1 for t in terms]
+    assert predictor.lookup(terms).tolist() == expected
+    assert predictor.lookup([]).tolist() == []
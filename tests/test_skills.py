@@ -0,0 +1,63 @@
+'''SkillTagger must tag exactly like the notebook, re.search(pattern, description) per doc and skill'''
+import random
+import re
+
+import pandas as pd
+
+from skills import SEPARATOR, SKILLS, SkillTagger, add_all_skills
+
+
+def per_doc_tags(docs, skills=SKILLS):
+    return [[re.search(pattern, doc) is not None for _, pattern in skills] for doc in docs]
+
+
+DOCS = [
+    '',
+    'python',
+    'we use python, sql and spark on aws (amazon web services).',
+    'experience with r, sas and matlab. some java, and javascript.',
+    'nosql only, no mysql',
+    'ml and a.i. experts. (ai) or ai, artificial intelligence',
+    ' r',                              # a match at the very start of a doc
+    'etl',                             # and ones which end at the end of a doc
+    'you should know c++ and power bi',
+    'ai',                              # 'ai' + next doc's ' ...' must not match across docs
+    ' sas is great',
+    'present' + SEPARATOR + 'ation',  # a separator inside a doc
+    'story telling, storytelling and a story about data mining and data-analysis',
+]
+
+
+def test_tags_match_per_doc_search():
+    matches = SkillTagger().tag(DOCS)
+    assert matches.to_frame().values.tolist() == per_doc_tags(DOCS)
+
+
+def test_match_offsets_are_the_first_match_in_each_doc():
+    matches = SkillTagger().tag(DOCS)
+    for i, k, start, end in zip(matches.doc, matches.skill, matches.start, matches.end):
+        match = re.search(SKILLS[k][1], DOCS[i])
+        assert (start, end) == match.span()
+
+
+def test_random_docs():
+    # Short docs made of skill fragments, so matches often touch the ends of docs
+    random.seed(0)
+    words = ['python', 'r', 'r.', 'sql', 'nosql', 'aws', '(ai)', 'ai', 'ml', 'etl', 'c++', 'sas,', 'java',
+             'script', 'big', 'data', '-', 'mining', 'story', 'power', 'bi', 'dev', 'ops', 'cloud', 'x', '']
+    docs = [' '.join(random.choice(words) for _ in range(random.randint(0, 6))) for _ in range(2000)]
+    matches = SkillTagger().tag(docs)
+    assert matches.to_frame().values.tolist() == per_doc_tags(docs)
+
+
+def test_missing_descriptions_and_no_docs():
+    matches = SkillTagger().tag([None, float('nan'), 'python'])
+    assert matches.to_frame().values.tolist() == per_doc_tags(['', '', 'python'])
+    assert SkillTagger().tag([]).matrix.shape == (0, len(SKILLS))
+
+
+def test_add_all_skills():
+    df = pd.DataFrame({'description': DOCS}, index=range(10, 10 + len(DOCS)))
+    df = add_all_skills(df)
+    assert list(df.index) == list(range(10, 10 + len(DOCS)))
+    assert df[[column for column, _ in SKILLS]].values.tolist() == per_doc_tags(DOCS)
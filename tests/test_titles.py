@@ -0,0 +1,104 @@
+'''simplify_titles must give the same labels as the notebook's if/elif chain'''
+import random
+import re
+
+import pandas as pd
+
+from titles import MERGES, add_target_variable, simplify_title, simplify_titles
+
+
+# Verbatim copy of the notebook's add_target_variable (but for a raw string, for the \s)
+def original_add_target_variable(df):
+    count_unmatched = 0
+    for index, row in df.iterrows():
+        title = row.title
+        title_simplified = 'Data Scientist' if 'data scientist' in title else '-'
+
+        if re.match('.*data.*scien(tist|ce).*', title) is not None:
+            title_simplified = 'data scientist'
+        elif 'nlp' in title:
+            title_simplified = 'nlp'
+        elif 'data analyst' in title:
+            title_simplified = 'data analyst'
+        elif re.match('.*data.*analy(st|tics).*', title) is not None:
+            title_simplified = 'data analyst'
+        elif 'data engineer' in title or 'cloud engineer' in title:
+            title_simplified = 'data engineer'
+        elif 'business analyst' in title:
+            title_simplified = 'business analyst'
+        elif re.match('.*(business.*(intel|analy(sis|st))|bi).*', title) is not None:
+            title_simplified = 'business intelligence'
+        elif re.match('.*machine.*learning.*', title) is not None:
+            title_simplified = 'machine learning engineer'
+        elif re.match(r'.*(artificial.*intelligence|\sai\s).*', title) is not None:
+            title_simplified = 'ai'
+        elif re.match('.*software.*engineer.*', title) is not None:
+            title_simplified = 'software engineer'
+        elif re.match('.*analy(st|tics).*', title) is not None:
+            title_simplified = 'analyst'
+        elif 'systems' in title:
+            title_simplified = 'systems'
+        elif 'software develop' in title:
+            title_simplified = 'software developer'
+        elif 'developer' in title:
+            title_simplified = 'developer'
+        elif 'research' in title:
+            title_simplified = 'research'
+        elif 'scientist' in title:
+            title_simplified = 'scientist'
+        elif 'admin' in title:
+            title_simplified = 'admin'
+        elif 'devops' in title:
+            title_simplified = 'devops'
+        else:
+            title_simplified = 'other'
+#             print(f'Extracted: Query:"{row.query_title}" Title:"{title}"')
+            count_unmatched = count_unmatched + 1
+            
+        df.loc[index, 'title_simplified'] = title_simplified
+
+    print(f'Count of unmatched: {count_unmatched}')
+    print(f'Cound of matched:   {len(df)-count_unmatched} ')
+    return df
+
+
+TITLES = [
+    '', 'data scientist', 'senior data scientist - nlp', 'nlp engineer', 'data science manager',
+    'data analyst', 'junior data analytics officer', 'big data engineer', 'cloud engineer (aws)',
+    'business analyst', 'business intelligence developer', 'bi developer', 'mobile engineer',
+    'machine learning engineer', 'head of artificial intelligence', 'senior ai researcher',
+    'lead ai developer', 'software engineer', 'analyst', 'marketing analytics lead', 'systems engineer',
+    'software developer', 'python developer', 'research associate', 'research scientist', 'scientist',
+    'admin assistant', 'devops engineer', 'chef', 'data', 'ai', ' ai ', 'engineer\nai\tlead',
+]
+
+
+def random_titles(n=3000):
+    # Titles made of the words the rules look for, so most rules and their orderings get exercised
+    random.seed(0)
+    words = ['data', 'science', 'scientist', 'analyst', 'analytics', 'analysis', 'engineer', 'cloud', 'nlp',
+             'business', 'intelligence', 'intel', 'bi', 'machine', 'learning', 'artificial', 'ai', 'software',
+             'systems', 'develop', 'developer', 'research', 'admin', 'devops', 'senior', '-', '(remote)']
+    return [' '.join(random.choice(words) for _ in range(random.randint(1, 5))) for _ in range(n)]
+
+
+def test_labels_match_original_chain():
+    titles = TITLES + random_titles()
+    expected = original_add_target_variable(pd.DataFrame({'title': titles}))['title_simplified']
+    assert simplify_titles(titles).tolist() == expected.tolist()
+    assert [simplify_title(t) for t in TITLES] == expected.tolist()[:len(TITLES)]
+
+
+def test_add_target_variable_matches_original():
+    df = pd.DataFrame({'title': TITLES * 2}, index=range(100, 100 + 2 * len(TITLES)))
+    expected = original_add_target_variable(df.copy())
+    result = add_target_variable(df, verbose=False)
+    assert result['title_simplified'].tolist() == expected['title_simplified'].tolist()
+    assert list(result.index) == list(df.index)
+
+
+def test_merge():
+    # As in the notebook, small classes are then folded into bigger ones
+    titles = random_titles(500)
+    expected = original_add_target_variable(pd.DataFrame({'title': titles}))['title_simplified'].replace(MERGES)
+    assert simplify_titles(titles, merge=True).tolist() == expected.tolist()
@@ -0,0 +1,66 @@
+'''tokenize_doc must give exactly the tokens of the original notebook tokeniser, clf.pkl was trained on them'''
+import pytest
+
+nltk = pytest.importorskip('nltk')
+from nltk.corpus import stopwords
+
+from clf_funcs import tokenize_doc
+
+
+# Verbatim copy of the original tokeniser (before caching and the single pass rewrite)
+def remove_stopwords_doc(doc):
+    # load stopwords and
+    stop_words = set(stopwords.words("english"))
+    words = [w for w in doc if (w not in stop_words) & (w.isalpha())]
+    return words
+
+def lemmatize_sent(sent):
+    lemmatizer = nltk.WordNetLemmatizer()
+    sent_out = [lemmatizer.lemmatize(w) for w in sent]
+    return sent_out
+
+def original_tokenize_doc(doc):
+    # Tidy up doc
+    doc = doc.lower()               # Lower case the whole doc
+    doc = doc.replace('\n',' ')     # Replace line breaks with spaces for tokenisation with weird formatting
+    
+    # Might eventually add n-grams in this loop
+    sents_list = nltk.sent_tokenize(doc)                               # Sentence tokenise the document (into list of sentences)
+    sents_list = [nltk.word_tokenize(sent) for sent in sents_list]          # Word tokenize each sentence
+    sents_list = [remove_stopwords_doc(sent) for sent in sents_list]        # Remove stopwords from each sentence
+    sents_list = [lemmatize_sent(sent) for sent in sents_list]              # Lemmatize each sentence
+    words_to_remove = ['scientist', 'science', 'analyst', 'analysis', 'engineer'] # Hardcoded words to remove
+    sents_list = [[w for w in sent if w not in words_to_remove] for sent in sents_list] # Remove unwanted words
+    ngrams_list = [nltk.ngrams(sent,2) for sent in sents_list]
+    
+    # Flatten lists
+    sent_expanded = [word for sent in sents_list for word in sent]          # [item for sublist in sents_list for item in sublist]
+    ngrams_expanded = [gram for sent in ngrams_list for gram in sent]       # Same for ngrams_list
+    ngrams_expanded = [' '.join(gram) for gram in ngrams_expanded]          # Convert ngram tuples to string token
+    tokens_list = sent_expanded + ngrams_expanded                          # Join into one long list
+
+    return tokens_list
+
+
+DOCS = [
+    '',
+    'Data Scientist',
+    'We are looking for a Data Scientist to join our analytics team. You will build models in Python and SQL.',
+    'Responsibilities:\n- Design data pipelines on AWS\n- Work with engineers and analysts\n\nSalary: £50,000 - £60,000',
+    "The Senior Data Engineer's role is to maintain the company's Spark clusters. Experience of Airflow is a plus!",
+    'Machine learning, deep learning & NLP. PhD in computer science or a related field... Hybrid working (2 days).',
+    'Analysis of large datasets; analysts, scientists and engineers collaborate daily. Apply now!!!',
+]
+
+
+@pytest.fixture(scope='module')
+def nltk_data():
+    try:
+        original_tokenize_doc(DOCS[2])
+    except LookupError:
+        pytest.skip('NLTK data (punkt, stopwords, wordnet) is not installed')
+
+
+@pytest.mark.parametrize('doc', DOCS)
+def test_tokenize_doc_matches_original(nltk_data, doc):
+    assert tokenize_doc(doc) == original_tokenize_doc(doc)